@@ -5,9 +5,11 @@ import atexit
 import sys
 import toml
 
-from plugins.PluginManager import PluginManager
+from plugins.PluginManager import PluginManager, BOOT_WORKERS
 from plugins.core.Skills import Skills
 from diary.LogManager import LogManager
+from diary.BootProfiler import PROFILER, CORE
+from utils import req_utils
 from utils.log_utils import LOG  #pylint: disable=no-name-in-module
 
 _PLUGIN_TYPES = ["core", "internal", "external"]
@@ -24,6 +26,7 @@ class Aigis():
     def __init__(self, config):
         # Register cleanup on exit.
         atexit.register(self.cleanup)
+        PROFILER.begin()
 
         # Load the config
         LOG.boot("Loading config...")
@@ -44,13 +47,27 @@ class Aigis():
 
         # Before plugins are even loaded, expose the core skills server
         from proxinator import _aigis
-        _aigis.CORE_SERVER.start()
+        with PROFILER.phase(CORE, "serve"):
+            _aigis.serve(self.config.get("rpc", {}))
 
-        # Load all plugins in order
-        for ptype in _PLUGIN_TYPES:
-            LOG.boot("Downloading configured %s plugins...", ptype)
-            self.plugins.load_all(self.config[ptype], self.log_manager)
-            LOG.boot("All %s plugins loaded!", ptype)
+        # Installs done long ago are run again, in case the environment changed since
+        with PROFILER.phase(CORE, "evict"):
+            stale = req_utils.evict(
+                self.config.get("boot", {}).get("requirements_max_age", req_utils.MAX_AGE_DAYS)
+            )
+        if stale:
+            LOG.boot("Requirements of %s will be installed again...", ", ".join(stale))
+
+        # Load all plugins, launching them in order
+        LOG.boot("Downloading configured plugins...")
+        self.plugins.load_all(
+            {ptype: self.config[ptype] for ptype in _PLUGIN_TYPES},
+            self.log_manager,
+            self.config.get("boot", {}).get("workers", BOOT_WORKERS)
+        )
+
+        # Report where the boot spent its time, and whether it got slower since the last one
+        PROFILER.report("boot")
 
     def cleanup(self):
         """
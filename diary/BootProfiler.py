@@ -0,0 +1,270 @@
+"""
+Time where AIGIS spends its boot, and that of plugins restarting or reloading.
+
+Every phase of loading a plugin is timed: downloading it, importing its config, contextualizing it,
+installing its requirements, copying its secrets, running it and registering its skills. The first call a
+plugin makes to the core which succeeds is marked too, being the moment the plugin is actually up.
+
+Once AIGIS has booted, or a plugin has restarted or reloaded, a report is logged and saved as JSON under
+cache/boot. The report holds the timings of every plugin, the total wall time and the critical path, being
+the chain of phases the boot had to wait on one after the other. It is compared with the previous report of
+the same kind, and phases which got noticeably slower are reported as regressions.
+"""
+import os
+import json
+import time
+import contextlib
+from datetime import datetime
+from threading import Lock
+
+from utils import path_utils  #pylint: disable=no-name-in-module
+from utils.log_utils import LOG  #pylint: disable=no-name-in-module
+
+REPORT_LOCATION = os.path.join(path_utils.CACHE_LOCATION, "boot")
+# Number of reports kept.
+KEEP_REPORTS = 20
+# A phase regressed if it got slower by this ratio and by at least this many seconds.
+REGRESSION_RATIO = 1.2
+REGRESSION_SECONDS = 0.25
+# Name the phases of AIGIS itself are recorded under.
+CORE = "AIGIS"
+
+
+class BootProfiler():
+    """
+    Collects the timings of plugins loading, and reports them.
+    Phases are recorded per plugin, starting over when the plugin restarts or reloads, so that reports of
+    plugins loading at the same time don't mix.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._started = {}
+        self._phases = {}
+        self._first_calls = {}
+        # Reports waiting for the first call of some of their plugins, by plugin name.
+        self._pending = {}
+
+    def begin(self, name=CORE):
+        """
+        Start timing a boot, or a plugin restarting or reloading, forgetting its previous timings.
+
+        :param str name: name of the plugin, or CORE for the whole boot
+        """
+        with self._lock:
+            self._started[name] = time.perf_counter()
+            self._phases.pop(name, None)
+            self._first_calls.pop(name, None)
+            self._pending.pop(name, None)
+
+    @contextlib.contextmanager
+    def phase(self, name, phase):
+        """
+        Time a phase of loading a plugin, while in the context. The phase is recorded even if it fails.
+
+        :param str name: name of the plugin, or CORE for phases of AIGIS itself
+        :param str phase: name of the phase
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._phases.setdefault(name, {})[phase] = (start, time.perf_counter())
+
+    def first_call(self, name):
+        """
+        Mark that a plugin made a successful call to the core, if it is its first.
+        Called on every call, so it returns right away for plugins which already made one.
+
+        :param str name: name of the plugin
+        """
+        if name in self._first_calls:
+            return
+        with self._lock:
+            if name in self._first_calls:
+                return
+            now = self._first_calls[name] = time.perf_counter()
+            pending = self._pending.pop(name, None)
+        if pending is not None:
+            report, path, started = pending
+            report["plugins"][name]["first_call"] = round(now - started, 3)
+            LOG.boot("%s made its first call to the core %.2fs into the %s.", name, now - started, report["kind"])
+            _save(report, path)
+
+    def report(self, kind, names=None):
+        """
+        Log and save the report of a boot, restart or reload, comparing it to the previous one of the kind.
+
+        :param str kind: "boot", "restart" or "reload"
+        :param list[str] names: names of the plugins to report on, every plugin timed for a boot
+
+        :returns: the report
+        :rtype: dict
+        """
+        with self._lock:
+            started = self._started.get(CORE if names is None else names[0], time.perf_counter())
+            if names is None:
+                names = sorted(self._phases)
+            plugins = {}
+            intervals = []
+            for name in names:
+                phases = self._phases.get(name, {})
+                plugins[name] = {
+                    "phases": {
+                        phase: {"start": round(start - started, 3), "duration": round(end - start, 3)}
+                        for phase, (start, end) in phases.items()
+                    }
+                }
+                if name in self._first_calls:
+                    plugins[name]["first_call"] = round(self._first_calls[name] - started, 3)
+                intervals.extend((start, end, name, phase) for phase, (start, end) in phases.items())
+        report = {
+            "kind": kind,
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "wall": round(time.perf_counter() - started, 3),
+            "plugins": plugins,
+            "critical_path": _critical_path(intervals, started)
+        }
+        previous = _previous(kind, names)
+        if previous is not None:
+            report["comparison"] = _compare(report, previous)
+        path = _save(report)
+        with self._lock:
+            for name in names:
+                if name != CORE and "first_call" not in plugins[name]:
+                    self._pending[name] = (report, path, started)
+        _log(report)
+        return report
+
+
+def _critical_path(intervals, started):
+    """
+    Find the chain of phases the boot waited on, going back from the phase which ended last to the phase
+    which ended last before it started, and so on.
+
+    :param list[tuple] intervals: (start, end, plugin name, phase) of every phase timed
+    :param float started: when the boot started
+
+    :returns: the phases of the critical path, in order
+    :rtype: list[dict]
+    """
+    path = []
+    candidates = sorted(intervals, key=lambda interval: interval[1])
+    while candidates:
+        start, end, name, phase = candidates.pop()
+        path.append({
+            "plugin": name, "phase": phase, "start": round(start - started, 3), "duration": round(end - start, 3)
+        })
+        candidates = [interval for interval in candidates if interval[1] <= start]
+    path.reverse()
+    return path
+
+
+def _previous(kind, names):
+    """
+    :param str kind: kind of the report
+    :param list[str] names: names of the plugins reported on
+
+    :returns: the last report of the same kind on the same plugins, if any
+    :rtype: dict|None
+    """
+    for filename in sorted(_reports(), reverse=True):
+        try:
+            with open(os.path.join(REPORT_LOCATION, filename)) as report_file:
+                report = json.load(report_file)
+        except (OSError, ValueError):
+            continue
+        if report.get("kind") == kind and (kind == "boot" or sorted(report["plugins"]) == sorted(names)):
+            return report
+    return None
+
+
+def _compare(report, previous):
+    """
+    :param dict report: the new report
+    :param dict previous: the previous report of the same kind
+
+    :returns: when the previous report was made, how the wall time changed and the phases which regressed
+    :rtype: dict
+    """
+    regressions = []
+    for name, plugin in report["plugins"].items():
+        before = previous["plugins"].get(name, {}).get("phases", {})
+        for phase, timing in plugin["phases"].items():
+            if phase not in before:
+                continue
+            old, new = before[phase]["duration"], timing["duration"]
+            if new > old * REGRESSION_RATIO and new - old >= REGRESSION_SECONDS:
+                regressions.append({"plugin": name, "phase": phase, "before": old, "after": new})
+    return {
+        "previous": previous["date"],
+        "wall_delta": round(report["wall"] - previous["wall"], 3),
+        "regressions": regressions
+    }
+
+
+def _reports():
+    """
+    :returns: the file names of the reports saved
+    :rtype: list[str]
+    """
+    try:
+        return [filename for filename in os.listdir(REPORT_LOCATION) if filename.endswith(".json")]
+    except OSError:
+        return []
+
+
+def _save(report, path=None):
+    """
+    Save a report, dropping the oldest ones past KEEP_REPORTS.
+
+    :param dict report: the report
+    :param str path: where to save it, a new file if not given
+
+    :returns: where the report was saved
+    :rtype: str
+    """
+    try:
+        path_utils.ensure_path_exists(REPORT_LOCATION)
+        if path is None:
+            path = os.path.join(
+                REPORT_LOCATION, "%s_%s.json" % (datetime.now().strftime("%Y%m%d-%H%M%S-%f"), report["kind"])
+            )
+            for filename in sorted(_reports())[:-KEEP_REPORTS + 1 or None]:
+                os.remove(os.path.join(REPORT_LOCATION, filename))
+        with open(path + ".tmp", "w") as report_file:
+            json.dump(report, report_file, indent=2)
+        os.replace(path + ".tmp", path)
+    except OSError as e:
+        LOG.warning("Could not save the %s report: %s", report["kind"], e)
+    return path
+
+
+def _log(report):
+    """
+    Log the summary of a report.
+
+    :param dict report: the report
+    """
+    LOG.boot(
+        "The %s took %.2fs. Critical path: %s", report["kind"], report["wall"],
+        " > ".join("%s %s %.2fs" % (step["plugin"], step["phase"], step["duration"])
+                   for step in report["critical_path"]) or "nothing"
+    )
+    for name, plugin in report["plugins"].items():
+        LOG.boot(
+            "%s: %s", name,
+            ", ".join("%s %.2fs" % (phase, timing["duration"]) for phase, timing in plugin["phases"].items())
+        )
+    comparison = report.get("comparison")
+    if comparison is None:
+        return
+    LOG.boot("%+.2fs compared to the %s of %s.", comparison["wall_delta"], report["kind"], comparison["previous"])
+    for regression in comparison["regressions"]:
+        LOG.warning(
+            "%s %s regressed from %.2fs to %.2fs.",
+            regression["plugin"], regression["phase"], regression["before"], regression["after"]
+        )
+
+
+PROFILER = BootProfiler()
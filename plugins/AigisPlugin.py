@@ -35,6 +35,8 @@ class AigisPlugin():
         self.type = ptype
         self.restart = restart
         self.reload = False
+        # Whether the plugin's source changed the last time it was downloaded
+        self.changed = True
         self.config = config
         self.loader = loader
         self.log = log_manager.hook(self)
@@ -72,9 +74,11 @@ class AigisPlugin():
 
         # VERY IMPORTANT
         self.type = self.config.PLUGIN_TYPE
-        self.restart = getattr(self.config, "RESTART", 0)
+        self.reset()
         if not hasattr(self.config, "SECRETS"):
             setattr(self.config, "SECRETS", {})
+        if not hasattr(self.config, "RPC_TIMEOUT"):
+            self.config.RPC_TIMEOUT = 0
         if self.type == "internal" and hasattr(self.config, "HOST"):
             self.type = "internal-remote"
         self.loader = _LOADER_TYPES.get(self.type, _LOADER_TYPES.get("default"))
@@ -87,6 +91,15 @@ class AigisPlugin():
         if not hasattr(self.config, "SYSTEM_REQUIREMENTS"):
             self.config.SYSTEM_REQUIREMENTS = []
 
+    def reset(self):
+        """
+        Reset the runtime state of the plugin to what its configuration sets, as when it was first configured.
+        Needed on every reload, including those keeping the configuration of an unchanged plugin.
+        """
+        self.restart = getattr(self.config, "RESTART", 0)
+        # Cleanup hooks set by a previous launch are set again by the next one, if the plugin still has any
+        self.__dict__.pop("cleanup", None)
+
     def cleanup(self):
         """
         Container function to handle cleaning up any resources used by the plugin.
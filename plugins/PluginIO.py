@@ -8,8 +8,9 @@ import time
 import shutil
 import asyncio
 import subprocess
-from threading import Thread
-from utils import path_utils, mod_utils, exc_utils
+from threading import Thread, Lock
+from utils import path_utils, mod_utils, exc_utils, req_utils
+from diary.BootProfiler import PROFILER
 from plugins.external.WatchDog import jiii
 
 
@@ -23,6 +24,8 @@ ALOOP_FOREVER.start()
 
 # Max number of seconds to launch a plugin.
 PLUGIN_LAUNCH_TIMEOUT = 10
+# Locks serializing the requirement installs of plugins being prepared at once, by installer.
+_INSTALL_LOCKS = {}
 
 class PluginIO():
     """
@@ -42,12 +45,47 @@ class PluginIO():
 
         :raises PluginLoadError: for any problem in loading the plugin
         """
+        cls.prepare(plugin)
+        cls.deploy(plugin, manager)
+
+    @classmethod
+    def prepare(cls, plugin):
+        """
+        Execute the steps of loading the plugin which don't depend on other plugins, so that they can be
+        done for several plugins at once.
+        CONTEXTUALIZE
+        REQUIREMENTS
+        SECRETS
+
+        :param AigisPlugin plugin: the plugin stored in core, regardless of plugin type.
+
+        :raises PluginLoadError: for any problem in preparing the plugin
+        """
+        try:
+            with PROFILER.phase(plugin.name, "contextualize"):
+                cls.contextualize(plugin)
+            with PROFILER.phase(plugin.name, "requirements"):
+                cls.requirements(plugin)
+            with PROFILER.phase(plugin.name, "secrets"):
+                cls.copy_secrets(plugin)
+        except exc_utils.PluginLoadError as e:
+            plugin.log.error(str(e))
+            raise
+
+    @classmethod
+    def deploy(cls, plugin, manager):
+        """
+        Run a prepared plugin.
+
+        :param AigisPlugin plugin: the plugin stored in core, regardless of plugin type.
+        :param PluginManager manager: this plugin manager singleton
+
+        :raises PluginLoadError: for any problem in running the plugin
+        """
         try:
-            cls.contextualize(plugin)
-            cls.requirements(plugin)
-            cls.copy_secrets(plugin)
             plugin.log.boot("Deploying...")
-            cls.run(plugin, manager)
+            with PROFILER.phase(plugin.name, "run"):
+                cls.run(plugin, manager)
         except exc_utils.PluginLoadError as e:
             plugin.log.error(str(e))
             raise
@@ -84,11 +122,19 @@ class PluginIO():
                 raise RequirementError("Fatal error. Host has no %s installed." % req)
 
         try:
-            subprocess.check_call(
-                plugin.config.REQUIREMENT_COMMAND.split(" ") + [plugin.config.REQUIREMENT_FILE],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL
-            )
+            command = plugin.config.REQUIREMENT_COMMAND.split(" ")
+            key = req_utils.requirements_key(command, plugin.config.REQUIREMENT_FILE)
+            if req_utils.is_installed(plugin.name, key):
+                plugin.log.boot("Requirements unchanged since last install, skipping...")
+                return
+            # Installers writing to the same environment at once can break it
+            with _INSTALL_LOCKS.setdefault(command[0], Lock()):
+                subprocess.check_call(
+                    req_utils.install_command(command) + [plugin.config.REQUIREMENT_FILE],
+                    stdout=subprocess.DEVNULL,
+                    stderr=subprocess.DEVNULL
+                )
+            req_utils.record(plugin.name, key)
         except subprocess.CalledProcessError as e:
             raise RequirementError("Requirement install exited with error code %s" % str(e))
         except AttributeError:
@@ -193,12 +239,13 @@ class CoreIO(PluginIO):
         # We need to add the plugin config's entrypoint to the PYTHONPATH
         # so imports work as expected on requirements
         sys.path.append(plugin.config.ENTRYPOINT)
-        core_skills._AIGISlearnskill(
-            mod_utils.import_from_path(
-                _prep_core_injector_file(plugin)
-            ),
-            plugin
-        )
+        with PROFILER.phase(plugin.name, "skills"):
+            core_skills._AIGISlearnskill(
+                mod_utils.import_from_path(
+                    _prep_core_injector_file(plugin)
+                ),
+                plugin
+            )
         plugin.log.boot("Skills acquired.")
 
     @staticmethod
@@ -222,12 +269,7 @@ class CoreIO(PluginIO):
         :param PluginManager manager: manager singleton for burial
         """
         import aigis as core_skills # AigisCore.skills
-        core_skills._AIGISforgetskill(
-            mod_utils.import_from_path(
-                _prep_core_injector_file(plugin)
-            ),
-            plugin
-        )
+        core_skills._AIGISforgetskill(plugin)
         plugin.log.shutdown("Skills deregistered.")
         manager.bury(plugin)
 
@@ -269,10 +311,11 @@ class InternalLocalIO(PluginIO):
             # so imports work as expected on requirements
             sys.path.append(plugin.config.ENTRYPOINT)
             import aigis
-            aigis._AIGISlearnskill(
-                mod_utils.import_from_path(core_file),
-                plugin
-            )
+            with PROFILER.phase(plugin.name, "skills"):
+                aigis._AIGISlearnskill(
+                    mod_utils.import_from_path(core_file),
+                    plugin
+                )
             plugin.log.boot("Internal plugin registered skills...")
 
         asyncio.run_coroutine_threadsafe(InternalLocalIO._async_process_start(plugin, manager), ALOOP)
@@ -310,12 +353,17 @@ class InternalLocalIO(PluginIO):
 
         :param AigisPlugin plugin: the plugin
         """
+        from proxinator import _aigis
         plugin._ext_proc = await asyncio.create_subprocess_exec(
             *[
                 sys.executable,
                 InternalLocalIO.ProxyPath,
                 "--ENTRYPOINT", plugin.config.ENTRYPOINT,
-                "--LAUNCH", plugin.config.LAUNCH
+                "--LAUNCH", plugin.config.LAUNCH,
+                "--ADDRESS", _aigis.format_address(_aigis.LOCAL_ADDRESS),
+                "--SERVER", _aigis.LOCAL_SERVER,
+                "--NAME", plugin.name,
+                "--TIMEOUT", str(plugin.config.RPC_TIMEOUT)
             ],
             stdout=plugin.log.filehandler,
             stderr=plugin.log.filehandler
@@ -3,15 +3,18 @@ Helper module to hold and organize loaded plugins.
 """
 #pylint: disable=import-error
 import os
-import shutil
 import traceback
-import subprocess
+import contextlib
+from threading import Lock
+from concurrent.futures import ThreadPoolExecutor
 
-from pygitcmd.cmdgit import GitRepo
-
-from utils import path_utils, exc_utils  #pylint: disable=no-name-in-module
+from utils import path_utils, exc_utils, git_utils, copy_utils  #pylint: disable=no-name-in-module
 from plugins.AigisPlugin import AigisPlugin
 from diary.AigisLog import LOG
+from diary.BootProfiler import PROFILER
+
+# Default max number of plugins downloaded and prepared at once on boot.
+BOOT_WORKERS = 4
 
 class PluginManager(list):
     """
@@ -20,21 +23,40 @@ class PluginManager(list):
     dead = []
     def __init__(self):
         super().__init__(self)
+        # Plugins being prepared at once can fail at once
+        self._lock = Lock()
         path_utils.ensure_path_exists(path_utils.PLUGIN_ROOT_PATH)
 
-    def load_all(self, config, log_manager):
+    def load_all(self, configs, log_manager, workers=BOOT_WORKERS):
         """
-        Download the plugins specified in the config
+        Download, configure and launch the plugins specified in the config.
+        Plugins are downloaded and prepared several at once, since that is mostly waiting on the network and
+        installers. They are then launched one at a time, one type after the other in the order given, so
+        that every core skill is registered before the first internal plugin launches.
 
-        :param dict config: the loaded plugins section of the config
+        :param dict[str, dict] configs: the loaded plugins section of each type in the config, by type, in
+        launch order
         :param LogManager log_manager: the log manager for this AIGIS instance
+        :param int workers: max number of plugins prepared at once
         """
-        for plugin_name in config:
-            LOG.info("Loading plugin %s...", plugin_name)
-            try:
-                self._load_one(plugin_name, log_manager, config[plugin_name])
-            except Exception as e:  #pylint: disable=broad-except
-                LOG.error("Could not load plugin %s!\n%s", plugin_name, str(e))
+        plugins = {
+            ptype: [self._new_plugin(plugin_name, log_manager, config[plugin_name]) for plugin_name in config]
+            for ptype, config in configs.items()
+        }
+        with ThreadPoolExecutor(workers, thread_name_prefix="aigis-boot") as pool:
+            prepared = {
+                ptype: [(plugin, pool.submit(self._try_prepare, plugin)) for plugin in plugins[ptype]]
+                for ptype in plugins
+            }
+            for ptype, plugins_prepared in prepared.items():
+                LOG.boot("Launching configured %s plugins...", ptype)
+                for plugin, future in plugins_prepared:
+                    try:
+                        future.result()
+                        self._try_deploy(plugin)
+                    except Exception as e:  #pylint: disable=broad-except
+                        LOG.error("Could not load plugin %s!\n%s", plugin.name, str(e))
+                LOG.boot("All %s plugins loaded!", ptype)
 
     def bury(self, plugin):
         """
@@ -43,16 +65,21 @@ class PluginManager(list):
         :param AigisPlugin plugin: dead plugin to bury
         """
         if plugin.restart or plugin.reload:
-            if plugin.reload:
-                plugin.log.info("Attempting to reload plugin...")
-                plugin.reload = False
-                # Since we're reloading, see if there's a new version
-                self._try_download_and_config(plugin)
-            elif plugin.restart:
-                plugin.log.info("Attempting to restart plugin...")
-                plugin.restart -= 1
-            # Try to launch actual plugin
-            self._try_load(plugin)
+            kind = "reload" if plugin.reload else "restart"
+            PROFILER.begin(plugin.name)
+            try:
+                if plugin.reload:
+                    plugin.log.info("Attempting to reload plugin...")
+                    plugin.reload = False
+                    # Since we're reloading, see if there's a new version
+                    self._try_download_and_config(plugin)
+                elif plugin.restart:
+                    plugin.log.info("Attempting to restart plugin...")
+                    plugin.restart -= 1
+                # Try to launch actual plugin
+                self._try_load(plugin)
+            finally:
+                PROFILER.report(kind, [plugin.name])
             return
 
         if plugin in self:
@@ -74,32 +101,45 @@ class PluginManager(list):
         for plugin in self:
             self._safe_cleanup(plugin)
 
-    def _load_one(self, plugin_name, log_manager, plugin_url):
+    def _new_plugin(self, plugin_name, log_manager, plugin_url):
         """
-        Fully load one plugin. This includes
-        - generating the AigisPlugin object (with logger)
-        - downloading the plugin source if necessary, or
-        - updating it if it already exists
-        - loading the plugin config as a module and
-        - attempting to load the plugin via PluginLoader
-        This function handles only logging error and issues to the plugin-specific loggers.
-        In any case of error loading the plugin, an exception will be raised.
+        Generate the AigisPlugin object (with logger) of a plugin to load, and track it.
 
         :param str plugin_name: name of plugin to load
         :param LogManager log_manager: the AIGIS LogManager singleton for this execution
         :param str plugin_url: web URL from which to download the plugin
+
+        :returns: the plugin
+        :rtype: AigisPlugin
         """
+        LOG.info("Loading plugin %s...", plugin_name)
         plugin = AigisPlugin(plugin_name, log_manager, plugin_url)
 
         # Plugin generated successfully, add to self for tracking
         self.append(plugin)
+        return plugin
 
-        plugin.log.boot("Downloading plugin...")
-        self._try_download_and_config(plugin)
+    def _try_prepare(self, plugin):
+        """
+        Get a plugin ready to launch. This includes
+        - downloading the plugin source if necessary, or
+        - updating it if it already exists
+        - loading the plugin config as a module and
+        - preparing the plugin via its loader, mainly installing its requirements
+        This function handles only logging error and issues to the plugin-specific loggers.
+        In any case of error preparing the plugin, it is buried and an exception will be raised.
+        Safe to call for several plugins at once.
 
-        plugin.log.boot("Preparing to launch...")
-        self._try_load(plugin)
+        :param AigisPlugin plugin: the plugin to prepare
 
+        :raises Exception: numerous exception types can be bubbled up from the various loading mechanisms
+        """
+        plugin.log.boot("Downloading plugin...")
+        with self._failing_safely(plugin):
+            if not self._try_download_and_config(plugin):
+                raise exc_utils.PluginLoadError("Could not download plugin.")
+            plugin.log.boot("Preparing to launch...")
+            plugin.loader.prepare(plugin)
 
     def _try_download_and_config(self, plugin):
         """
@@ -113,11 +153,17 @@ class PluginManager(list):
         :returns: if the download and configuration was successful.
         :rtype: bool
         """
-        if not download_plugin(plugin, plugin.src_url, plugin.root):
-            return False
-
-        # Update configuration in this case
-        plugin.configure()
+        with PROFILER.phase(plugin.name, "download"):
+            if not download_plugin(plugin, plugin.src_url, plugin.root):
+                return False
+
+        # Update configuration in this case, unless the source is the same as when it was configured
+        if plugin.changed or plugin.config is None:
+            with PROFILER.phase(plugin.name, "configure"):
+                plugin.configure()
+        else:
+            plugin.log.boot("Plugin unchanged, keeping its configuration...")
+            plugin.reset()
         return True
 
     def _try_load(self, plugin):
@@ -130,15 +176,39 @@ class PluginManager(list):
 
         :raises Exception: numerous exception types can be bubbled up from the various loading mechanisms
         """
-        try:
+        with self._failing_safely(plugin):
             plugin.loader.load(plugin, self)
+
+    def _try_deploy(self, plugin):
+        """
+        Attempt to safely launch a single prepared plugin using it's launcher, like _try_load.
+
+        :param AigisPlugin plugin: the plugin to launch
+
+        :raises Exception: numerous exception types can be bubbled up from the various loading mechanisms
+        """
+        with self._failing_safely(plugin):
+            plugin.loader.deploy(plugin, self)
+
+    @contextlib.contextmanager
+    def _failing_safely(self, plugin):
+        """
+        End the plugin's cycle immediately if a step of loading it fails, then let the error through.
+
+        :param AigisPlugin plugin: the plugin being loaded
+
+        :raises Exception: whatever the step raised
+        """
+        try:
+            yield
         except Exception as e:
             if isinstance(e, exc_utils.PluginLoadError):
                 plugin.log.shutdown("Could not load plugin, shutting down...")
             else:
                 plugin.log.shutdown("Unknown error occurred launching plugin:\n%s", traceback.format_exc())
-            self.pop(self.index(plugin))
-            self.dead.append(plugin)
+            with self._lock:
+                self.pop(self.index(plugin))
+                self.dead.append(plugin)
             self._safe_cleanup(plugin)
             raise
 
@@ -168,6 +238,7 @@ class PluginManager(list):
 def download_plugin(plugin, source_path, plugin_path):
     """
     Put plugin in runtime location by either copying it from a location on disk or cloning it from github.
+    Whether the plugin's source changed is recorded on the plugin.
 
     :param AigisPlugin plugin: the plugin object
     :param str source_path: either the path on disk to the plugin source or the github https clone link
@@ -183,7 +254,7 @@ def download_plugin(plugin, source_path, plugin_path):
 
 def _local_copy_plugin(plugin, local_source, plugin_path):
     """
-    Copy a plugin's source from a location on disk to the runtime plugin path.
+    Copy a plugin's source from a location on disk to the runtime plugin path, or bring the copy up to date.
 
     :param AigisPlugin plugin: plugin object
     :param str local_source: path to copy from
@@ -192,52 +263,42 @@ def _local_copy_plugin(plugin, local_source, plugin_path):
     :returns: if instruction was successful
     :rtype: bool
     """
-    if os.path.exists(plugin_path):
-        plugin.log.warning("Plugin exists, it will not get updated.")
-        return True
     try:
-        shutil.copytree(local_source, plugin_path)
+        plugin.changed = copy_utils.sync(local_source, plugin_path)
     except Exception as e:  #pylint: disable=broad-except
         plugin.log.error(
             "Could not copy files from\n%s to\n%s because\n%s", local_source, plugin_path, str(e)
         )
         return False
+    if not plugin.changed:
+        plugin.log.info("Plugin is up to date.")
     return True
 
 
-def _git_download_plugin(plugin, github_path, plugin_path):
+def _git_download_plugin(plugin, git_url, plugin_path):
     """
-    Download a plugin from github to a local path
+    Clone a plugin from git to a local path, or bring its clone up to date.
+    A clone which can't be updated is used as it is.
 
     :param AigisPlugin plugin: plugin object
-    :param str github_path: path to download
+    :param str git_url: URL of the repository to download
     :param str plugin_path: path to download to
 
     :returns: if instruction was successful
     :rtype: bool
     """
-    if path_utils.ensure_path_exists(plugin_path):
-        try:
-            plugin.log.info("Plugin already installed, making sure it's up to date...")
-            subprocess.check_output(["git", "pull"], cwd=plugin_path)
-        except Exception:  #pylint: disable=broad-except
-            plugin.log.warning("Unable to update plugin. Git Pull failed.")
-        return True
+    installed = os.path.isdir(os.path.join(plugin_path, ".git"))
+    if installed:
+        plugin.log.info("Plugin already installed, making sure it's up to date...")
     try:
-        _download(github_path, plugin_path)
-    except IOError:
-        plugin.log.error("Problem accessing filepath, skipping plugin")
-        return False
+        plugin.changed = git_utils.sync(git_url, plugin_path)
+    except git_utils.GitSyncError as e:
+        if not installed:
+            plugin.log.error("Could not clone plugin, skipping plugin.\n%s", str(e))
+            return False
+        plugin.log.warning("Unable to update plugin.\n%s", str(e))
+        plugin.changed = False
+        return True
+    if installed and not plugin.changed:
+        plugin.log.info("Plugin is up to date.")
     return True
-
-
-def _download(url, plugin_path):
-    """
-    Download a specific plugin
-
-    :param str url: the github url to download ("account/repo-name")
-    :param str plugin_path: path to download to
-    """
-    gr = GitRepo(plugin_path, url)
-    gr.clone()
-    gr.checkout("master")
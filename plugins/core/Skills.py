@@ -2,21 +2,52 @@
 Container class for the singleton which holds all core plugins' modules for shared use.
 """
 #pylint: disable=invalid-name,import-error
+import time
+import pickle
+import inspect
+import functools
+from collections import deque, OrderedDict
+from collections.abc import Iterator
+from threading import Condition, Lock
+
 from utils import exc_utils
 
+# Number of skill changes remembered for plugins catching up on invalidations.
+_CHANGE_HISTORY = 64
+# Max number of results kept by a cached skill, unless its plugin sets one.
+_CACHE_SIZE = 128
+
 
 class Skills():
     """
     The skills class is built to mock dynamic runtime inheritance based on loaded plugins.
     Only a single instance of this class should be made, and the private functions it exposes
-    (_AIGISlearnskill and _AIGISrecurdict) should only be called by the core AIGIS code.
+    (_AIGISlearnskill and _AIGISforgetskill) should only be called by the core AIGIS code.
+
+    Registered skills are kept in a flat registry of records keyed by their dotted name, holding the plugin
+    which owns them and how they are called, so the RPC server can resolve a call with a single lookup
+    rather than walking the namespaces. The namespaces are only built from the registry, for core plugins
+    using each other's skills directly.
+
+    Every time skills are learned or forgotten, the generation is incremented and the top level names that
+    changed are recorded, so that plugins caching values from the core can be told to invalidate them.
 
     AIGISReload is intentionally exposed to allow plugins to request others to reload themselves.
+    AIGISStats is exposed to let plugins inspect how the core's skills are used.
+    AIGISCacheStats is exposed to let plugins inspect how well the results of cached skills are reused.
 
     :param PluginManager manager: the plugin manager singleton
     """
     def __init__(self, manager):
         self.__plugin_manager__ = manager
+        self._AIGISregistry = {}
+        # Dotted names of the skills registered by each plugin, by plugin name.
+        self._AIGISowned = {}
+        self._AIGISgeneration = 0
+        self._AIGISchanges = deque(maxlen=_CHANGE_HISTORY)
+        self._AIGISchanged = Condition()
+        # Callables notified after every change, for servers that can't block on the condition.
+        self._AIGISwatchers = []
 
     def AIGISReload(self, plugin_name):
         """
@@ -30,77 +61,322 @@ class Skills():
                 plugin.loader.reload(plugin, self.__plugin_manager__)
                 break
 
+    def AIGISStats(self):
+        """
+        Fetch the stats of the calls made to core skills by internal plugins.
+
+        :returns: calls, errors, latency and payload sizes of each skill by dotted name, then by calling plugin
+        :rtype: dict[str, dict[str, dict]]
+        """
+        from proxinator import _stats
+        return _stats.snapshot()
+
+    def AIGISCacheStats(self):
+        """
+        Fetch the stats of the caches of the skills declared as cacheable by their plugin.
+
+        :returns: hits, misses, evictions, expirations, size and settings of each cache by dotted name
+        :rtype: dict[str, dict]
+        """
+        return {
+            name: record.cache.stats()
+            for name, record in list(self._AIGISregistry.items()) if record.cache is not None
+        }
+
     def _AIGISlearnskill(self, mod, plugin):
         """
         Join a given dict with this class' dict, essentially extending the functionality of the class.
+        Skills also listed in the module's PROCESS_SKILLS are run in a pool of worker processes, the
+        results of those listed in its CACHED_SKILLS are memoized, identical concurrent calls to those
+        listed in its COALESCED_SKILLS share a single execution, and the results of those listed in its
+        REFERENCE_SKILLS stay in the core while plugins receive handles to them.
 
         :param module mod: module who's functionality to port
         :param AigisPlugin plugin: this AigisPlugin
+
+        :raises NamespaceLockError: if a skill listed in SKILLS cannot be found in the module
         """
+        process_skills = [name for name in getattr(mod, "PROCESS_SKILLS", []) if name in mod.SKILLS]
+        if process_skills:
+            from proxinator import _procpool
+            pool = _procpool.start(plugin, mod, process_skills)
+        cached_skills = getattr(mod, "CACHED_SKILLS", {})
+        coalesced_skills = set(getattr(mod, "COALESCED_SKILLS", []))
+        referenced_skills = set(getattr(mod, "REFERENCE_SKILLS", []))
         for name in mod.SKILLS:
             pseq = name.split(".")
-            self._AIGISrecurdict(mod, pseq, 0, self, plugin.log)
+            raw = _resolve(mod, pseq)
+            record = _SkillRecord(name, plugin.name, raw, decorator(raw, plugin.log))
+            if name in process_skills:
+                record.process = True
+                record.skill = _procpool.ProcessSkill(pool, name, record.skill)
+            if name in cached_skills and callable(record.skill):
+                record.cache = record.skill = _CachedSkill(record.skill, **cached_skills[name])
+            record.coalesced = name in coalesced_skills
+            record.referenced = name in referenced_skills
+            self._AIGISregister(record)
             plugin.log.boot("Registered %s...", name)
+        self._AIGISinvalidate({name.split(".")[0] for name in mod.SKILLS})
 
         # If the core plugin has exposed a way to perform a cleanup of it's resources, mark that in the
         # AigisPlugin to be called on program exit.
         if hasattr(mod, "cleanup"):
             plugin.cleanup = mod.cleanup
 
-    def _AIGISforgetskill(self, mod, plugin):
+    def _AIGISforgetskill(self, plugin):
         """
-        Remove the attributes from a module that were loaded into this class.
+        Remove the skills a plugin loaded into this class. Skills registered by other plugins under the
+        same names are left alone.
         Somewhat dangerous to call, obviously. Should only be called as part of reloading a core module, and
         all that entails.
 
-        :param module mod: module who's functionality to port
         :param AigisPlugin plugin: this AigisPlugin
         """
-        top_level_removed = []
-        for name in mod.SKILLS:
-            pseq = name.split(".")
-            if pseq[0] in top_level_removed:
-                plugin.log.debug("Name %s deregistered by pruning.", name)
-                continue
-            try:
-                delattr(self, pseq[0])
-                top_level_removed.append(pseq[0])
-            except AttributeError:
-                plugin.log.error("Attempted to deregister %s, which cannot be found in the core.", pseq[0])
-                continue
-            plugin.log.warning("Deregistered %s and everything downstream.", pseq[0])
-
-    def _AIGISrecurdict(self, mod, pseq, i, ns, log):
-        """
-        False recursivity to parse the point sequence of the submitted injection and copy the
-        attributes into a namespace proxy within this Skills instance.
-
-        Do NOT call randomly.
-
-        :param object mod: object at this layer of the point sequence
-        :param list[str] pseq: the complete point sequence
-        :param int i: current point sequence index
-        :param object ns: _Namespace or parent module in which to add the current point sequence object
-        :param logging.logger log: the injecting AigisPlugin's logger for decorating callables
-
-        :raises NamespaceLockError: if the point sequence cannot be followed. While this could be
-        some meme python thing, most times it is probably because of a typo or logic error in the
-        injector file's SKILLS list.
-        """
-        if i+1 == len(pseq):
-            setattr(ns, pseq[i], decorator(getattr(mod, pseq[i]), log))
-            return
-        if pseq[i] in dir(mod):
-            if pseq[i] in dir(ns):
-                self._AIGISrecurdict(getattr(mod, pseq[i]), pseq, i+1, getattr(ns, pseq[i]), log)
-            else:
-                setattr(ns, pseq[i], _Namespace())
-                self._AIGISrecurdict(getattr(mod, pseq[i]), pseq, i+1, getattr(ns, pseq[i]), log)
+        names = self._AIGISowned.pop(plugin.name, set())
+        if not names:
+            plugin.log.error("Attempted to deregister the plugin's skills, none can be found in the core.")
             return
-        raise NamespaceLockError(
-            "Module path %s cannot be followed. Cannot find %s in %s...\n%s" %
-            (".".join(pseq), pseq[i], mod, dir(mod))
-        )
+        process = False
+        for name in names:
+            record = self._AIGISregistry.pop(name)
+            process = process or record.process
+            self._AIGISdetach(name.split("."))
+            plugin.log.debug("Deregistered %s.", name)
+        plugin.log.warning("Deregistered %s skills.", len(names))
+        self._AIGISinvalidate({name.split(".")[0] for name in names})
+        if process:
+            from proxinator import _procpool
+            _procpool.stop(plugin)
+
+    def _AIGISregister(self, record):
+        """
+        Add a skill to the registry and to its namespace, replacing any skill registered under the same
+        name.
+
+        :param _SkillRecord record: the skill
+        """
+        previous = self._AIGISregistry.get(record.name)
+        if previous is not None and previous.plugin != record.plugin:
+            self._AIGISowned[previous.plugin].discard(record.name)
+        self._AIGISregistry[record.name] = record
+        self._AIGISowned.setdefault(record.plugin, set()).add(record.name)
+        pseq = record.name.split(".")
+        namespace = self
+        for attr in pseq[:-1]:
+            child = vars(namespace).get(attr)
+            if child is None:
+                child = _Namespace()
+                setattr(namespace, attr, child)
+            namespace = child
+        setattr(namespace, pseq[-1], record.skill)
+
+    def _AIGISdetach(self, pseq):
+        """
+        Remove a skill from its namespace, along with the namespaces left empty.
+
+        :param list[str] pseq: point sequence of the skill
+        """
+        path = [self]
+        for attr in pseq[:-1]:
+            namespace = vars(path[-1]).get(attr)
+            if namespace is None:
+                return
+            path.append(namespace)
+        vars(path[-1]).pop(pseq[-1], None)
+        for i in range(len(pseq) - 2, -1, -1):
+            if not isinstance(path[i+1], _Namespace) or vars(path[i+1]):
+                break
+            delattr(path[i], pseq[i])
+
+    def _AIGISinvalidate(self, names):
+        """
+        Record that the skills under some top level names have changed and wake up anyone waiting on it.
+
+        :param iterable[str] names: top level names of the skills that changed
+        """
+        with self._AIGISchanged:
+            self._AIGISgeneration += 1
+            self._AIGISchanges.append((self._AIGISgeneration, frozenset(names)))
+            self._AIGISchanged.notify_all()
+        for watcher in self._AIGISwatchers:
+            watcher()
+
+    def _AIGISwaitchange(self, generation, timeout):
+        """
+        Wait until the skills change past a given generation.
+
+        :param int generation: last generation known by the caller
+        :param float timeout: max number of seconds to wait
+
+        :returns: the current generation and the top level names that changed since the given generation,
+        or None if they are too old to be known and everything should be considered changed
+        :rtype: tuple(int, list[str]|None)
+        """
+        with self._AIGISchanged:
+            self._AIGISchanged.wait_for(lambda: self._AIGISgeneration > generation, timeout)
+            if self._AIGISgeneration == generation:
+                return generation, []
+            changes = [names for gen, names in self._AIGISchanges if gen > generation]
+            if len(changes) < self._AIGISgeneration - generation:
+                return self._AIGISgeneration, None
+            return self._AIGISgeneration, sorted(set().union(*changes))
+
+    def _AIGISmanifest(self):
+        """
+        Describe every skill that can be called through the core, so that plugins know what exists before
+        calling it. This includes the AIGIS builtins exposed by this class.
+
+        :returns: the current generation and the description of each skill by dotted name, being whether it
+        is callable and its signature if it can be determined
+        :rtype: tuple(int, dict[str, tuple(bool, str|None)])
+        """
+        generation = self._AIGISgeneration
+        manifest = {
+            name: _describe(getattr(self, name)) for name in dir(type(self)) if name.startswith("AIGIS")
+        }
+        for name, record in list(self._AIGISregistry.items()):
+            manifest[name] = _describe(record.skill)
+        return generation, manifest
+
+
+class _SkillRecord():
+    """
+    A skill registered in the core, and how calls to it are handled.
+
+    :param str name: dotted name of the skill
+    :param str plugin: name of the plugin which registered it
+    :param object raw: the skill as found in the plugin's core file
+    :param object skill: the skill as called, decorated with the plugin's log
+    """
+    def __init__(self, name, plugin, raw, skill):
+        self.name = name
+        self.plugin = plugin
+        self.raw = raw
+        self.skill = skill
+        # Run in the plugin's worker processes
+        self.process = False
+        # The cache memoizing its results, if any
+        self.cache = None
+        # Identical concurrent calls share a single execution
+        self.coalesced = False
+        # Plugins receive a handle to its results rather than a copy
+        self.referenced = False
+
+
+def _resolve(mod, pseq):
+    """
+    Follow the point sequence of a skill in the module exposing it.
+
+    :param module mod: the plugin's core file
+    :param list[str] pseq: the point sequence of the skill
+
+    :returns: the object at the end of the point sequence
+    :rtype: object
+
+    :raises NamespaceLockError: if the point sequence cannot be followed. While this could be
+    some meme python thing, most times it is probably because of a typo or logic error in the
+    injector file's SKILLS list.
+    """
+    obj = mod
+    for attr in pseq:
+        try:
+            obj = getattr(obj, attr)
+        except AttributeError:
+            raise NamespaceLockError(
+                "Module path %s cannot be followed. Cannot find %s in %s...\n%s" %
+                (".".join(pseq), attr, obj, dir(obj))
+            ) from None
+    return obj
+
+
+class _CachedSkill():
+    """
+    Memoizes the results of a skill, by its arguments. Results expire after a while if a TTL is set, and the
+    least recently used ones are evicted once the cache is full. Calls whose arguments can't be hashed or
+    pickled, calls which raise and iterators returned are never cached.
+    Looks like the skill it wraps, so that its signature can still be described to plugins.
+
+    :param callable skill: the skill whose results to cache
+    :param float ttl: number of seconds a result stays valid, forever if not set
+    :param int size: max number of results kept
+    """
+    def __init__(self, skill, ttl=None, size=_CACHE_SIZE):
+        functools.update_wrapper(self, skill)
+        self.skill = skill
+        self.ttl = ttl
+        self.size = size
+        self._results = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "uncacheable": 0}
+
+    def __call__(self, *args, **kwargs):
+        """
+        Fetch the cached result of the call, or call the skill and cache its result.
+
+        :param args: the skill's args
+        :param kwargs: the skill's kwargs
+
+        :returns: the return of the skill
+        :rtype: object
+        """
+        key = call_key(args, kwargs)
+        if key is None:
+            with self._lock:
+                self._stats["uncacheable"] += 1
+            return self.skill(*args, **kwargs)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                if cached[0] is None or cached[0] > now:
+                    self._results.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return cached[1]
+                del self._results[key]
+                self._stats["expirations"] += 1
+            self._stats["misses"] += 1
+        result = self.skill(*args, **kwargs)
+        if isinstance(result, Iterator):
+            return result
+        with self._lock:
+            self._results[key] = (now + self.ttl if self.ttl else None, result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.size:
+                self._results.popitem(last=False)
+                self._stats["evictions"] += 1
+        return result
+
+    def stats(self):
+        """
+        :returns: hits, misses, evictions, expirations, calls that couldn't be cached, number of results
+        cached and the settings of the cache
+        :rtype: dict
+        """
+        with self._lock:
+            return dict(self._stats, entries=len(self._results), size=self.size, ttl=self.ttl)
+
+
+def call_key(args, kwargs):
+    """
+    Build a key identifying the arguments of a call, to tell identical calls apart. Arguments are hashed as
+    is if possible, otherwise pickled, so that calls with equal lists or dicts still match.
+
+    :param tuple args: the call's args
+    :param dict kwargs: the call's kwargs
+
+    :returns: the key, or None if the arguments can't be used as one
+    :rtype: object
+    """
+    key = (args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+        return key
+    except TypeError:
+        pass
+    try:
+        return pickle.dumps(key, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:  #pylint: disable=broad-except
+        return None
 
 
 class _Namespace():
@@ -116,10 +392,33 @@ class NamespaceLockError(exc_utils.PluginLoadError):
     """
 
 
+def _describe(skill):
+    """
+    Describe a skill for the manifest. The logger parameter passed by the core is not part of the signature
+    exposed to callers.
+
+    :param object skill: the registered skill
+
+    :returns: whether the skill is callable and its signature if it can be determined
+    :rtype: tuple(bool, str|None)
+    """
+    if not callable(skill):
+        return False, None
+    try:
+        signature = inspect.signature(skill)
+    except (TypeError, ValueError):
+        return True, None
+    params = [param for name, param in signature.parameters.items() if name != "logger"]
+    return True, str(signature.replace(parameters=params))
+
+
 def decorator(f, log):
     """
     Decorates f to include passing the plugin's log
     Decorator taking any imported callable and wrapping it to include passing the plugin's log.
+    The wrapper is picked once, from the callable's signature: callables taking a logger get it bound
+    as named argument, others are left as is. Callables whose signature can't be read get a wrapper
+    retrying without the logger on each call instead.
 
     :param callable f: function to decorate
     :param AigisLog.log log: log of the plugin
@@ -129,6 +428,32 @@ def decorator(f, log):
     """
     if not callable(f):
         return f
+    try:
+        parameters = inspect.signature(f).parameters.values()
+    except (TypeError, ValueError):
+        return _retrying_decorator(f, log)
+    if any(
+        (param.name == "logger" and param.kind != param.POSITIONAL_ONLY) or param.kind == param.VAR_KEYWORD
+        for param in parameters
+    ):
+        return functools.update_wrapper(functools.partial(f, logger=log), f)
+    log.warning("Function %s does not take a logger, it will be called without AIGIS logging...", str(f))
+    return f
+
+
+def _retrying_decorator(f, log):
+    """
+    Decorates f to include passing the plugin's log, for callables whose signature is unknown.
+    The first call made tells whether the callable takes the log, later calls skip the check.
+
+    :param callable f: function to decorate
+    :param AigisLog.log log: log of the plugin
+
+    :returns: the wrapped callable
+    :rtype: callable
+    """
+    takes_logger = True
+    @functools.wraps(f)
     def internal(*args, **kwargs):
         """
         Call the callable with the plugin's log as named argument. If a TypeError is raised, quickly
@@ -144,11 +469,35 @@ def decorator(f, log):
         :raises TypeError: if a TypeError is raised from the called function, unless it is due to
         not supporting the "log" parameter
         """
+        nonlocal takes_logger
+        if not takes_logger:
+            return f(*args, **kwargs)
         try:
             return f(*args, logger=log, **kwargs)
         except TypeError as e:
-            if "unexpected keyword argument 'logger'" in str(e):
+            if _rejects_logger(e):
+                takes_logger = False
                 log.warning("Function %s called without AIGIS logging...", str(f))
                 return f(*args, **kwargs)
             raise
     return internal
+
+
+def _rejects_logger(error):
+    """
+    Tell a TypeError raised because the callable doesn't take the logger from one raised by the callable
+    itself, which must not be retried.
+
+    :param TypeError error: the error raised calling the callable with the logger
+
+    :returns: whether the error is due to passing the logger
+    :rtype: bool
+    """
+    message = str(error)
+    return (
+        "unexpected keyword argument 'logger'" in message
+        # Builtins and extension functions
+        or "'logger' is an invalid keyword argument" in message
+        # A positional argument named logger
+        or ("got multiple values for" in message and message.endswith("'logger'"))
+    )
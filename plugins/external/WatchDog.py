@@ -1,6 +1,8 @@
 """
 Helper file to handle watching the processes to completion/crash
 """
+from proxinator import _refs, _streams  #pylint: disable=import-error
+
 
 async def jiii(plugin, manager):
     """
@@ -17,4 +19,7 @@ async def jiii(plugin, manager):
     """
     await plugin._ext_proc.wait()
     plugin.log.shutdown("Process exited with code %s", plugin._ext_proc.returncode)
+    # Objects and iterators the core was holding for the plugin can't be reached anymore
+    _refs.release_owner(plugin.name)
+    _streams.release_owner(plugin.name)
     manager.bury(plugin)
@@ -2,17 +2,35 @@
 This module holds the local server responsible for handling the incoming RPC calls from internal plugins
 running in subprocesses.
 """
+import os
+import time
+import functools
+import contextlib
+import atexit
+import tempfile
+import contextvars
+from collections.abc import Iterator
 from threading import Thread
 from multiprocess.managers import SyncManager
 
+from utils.log_utils import LOG  #pylint: disable=no-name-in-module
+from diary.BootProfiler import PROFILER
+from proxinator import _shm, _codecs, _streams, _stats, _scheduler, _coalesce, _refs
 import aigis
 
 
 class AIGISpseq():
     """
     Wrapper class around the logic used to parse the pseq of the requested call.
-    A class instance is required by the multiprocess manager library.
+    A class instance is required by the multiprocess manager library. Each plugin connecting gets its own
+    instance, identifying it, so that its calls can be scheduled fairly with the others.
+
+    :param str caller: name of the plugin making the calls
     """
+    def __init__(self, caller="unknown"):
+        self.caller = caller
+        self.scheduler = SCHEDULER
+
     def parse_pseq(self, pseq, *args, **kwargs):
         """
         Endpoint to call any value found in aigis, forwarding the parameters used.
@@ -21,21 +39,330 @@ class AIGISpseq():
         :param args: args to forward
         :param kwargs: kwargs to forward
 
-        :returns: result of final layer
-        :rtype: object
+        :returns: the result of final layer, packed for transfer
+        :rtype: tuple
 
         :raises TypeError: if the arguments do not match the requested function's signature.
         """
-        toret = self._recurpseq(pseq, 0, aigis)
-        if callable(toret):
-            toret = toret(*args, **kwargs)
-        elif args or kwargs:
-            raise TypeError("Too many arguments:\n%s\n%s" % (args, kwargs))
-        # This allows the custom dill package to properly regenerate all the needed properties client-side
-        if type(toret).__module__ != "builtins":
-            type(toret).__module__ = "__main__"
-        return toret
+        return self._execute(pseq, args, kwargs)
+
+    def parse_pseq_until(self, timeout, pseq, *args, **kwargs):
+        """
+        Endpoint to call any value found in aigis with a deadline. Calls which can't start before the deadline
+        are abandoned, and the result of calls completing after it is discarded, the plugin having given up.
+
+        :param float timeout: number of seconds the plugin waits for the call
+        :param list[str] pseq: point sequence in mainc to follow
+        :param args: args to forward
+        :param kwargs: kwargs to forward
+
+        :returns: the result of final layer, packed for transfer
+        :rtype: tuple
+
+        :raises TypeError: if the arguments do not match the requested function's signature.
+        :raises TimeoutError: if the call did not complete before the deadline
+        """
+        with _deadline(timeout):
+            return self._execute(pseq, args, kwargs)
+
+    def parse_batch(self, calls):
+        """
+        Endpoint to process several point sequences in a single round trip. Each call is executed in order
+        and its outcome is recorded independently, so one failing call does not prevent the others from
+        running.
+
+        :param list[tuple] calls: (pseq, args, kwargs) of each call to make
+
+        :returns: (success, packed result or raised exception) of each call, in the order received
+        :rtype: list[tuple]
+        """
+        results = []
+        for pseq, args, kwargs in calls:
+            try:
+                results.append((True, self._execute(pseq, args, kwargs)))
+            except Exception as e:  #pylint: disable=broad-except
+                results.append((False, e))
+        return results
+
+    def parse_batch_until(self, timeout, calls):
+        """
+        Endpoint to process several point sequences in a single round trip, with a deadline for them all.
+        Calls which can't complete before the deadline fail with a TimeoutError.
+
+        :param float timeout: number of seconds the plugin waits for the batch
+        :param list[tuple] calls: (pseq, args, kwargs) of each call to make
+
+        :returns: (success, packed result or raised exception) of each call, in the order received
+        :rtype: list[tuple]
+        """
+        with _deadline(timeout):
+            return self.parse_batch(calls)
+
+    def wait_invalidation(self, generation, timeout):
+        """
+        Endpoint blocking until the core's skills change, so that plugins can drop the constants they have
+        cached. Plugins call this in a loop from a dedicated thread, which emulates the core pushing
+        invalidations to them.
+
+        :param int generation: last skill generation known by the plugin
+        :param float timeout: max number of seconds to wait for a change
+
+        :returns: the current generation and the top level names that changed since the plugin's
+        generation, or None if everything should be considered changed
+        :rtype: tuple(int, list[str]|None)
+        """
+        return aigis._AIGISwaitchange(generation, timeout)
+
+    def next_chunk(self, stream_id, size=None):
+        """
+        Endpoint to pull the next chunk of items from an iterator returned by a skill.
+
+        :param int stream_id: id of the stream, as sent with the iterator
+        :param int size: max number of items to read. Defaults to the configured chunk size.
+
+        :returns: (kind, payload, done) where kind and payload are the packed list of items read and done is
+        whether the iterator is exhausted
+        :rtype: tuple
+
+        :raises KeyError: if the stream does not exist (anymore)
+        """
+        chunk, done = _streams.read(stream_id, size)
+        return _pack(chunk) + (done,)
+
+    def next_chunk_until(self, timeout, stream_id, size=None):
+        """
+        Endpoint to pull the next chunk of items from an iterator returned by a skill, unless the plugin
+        already stopped waiting for it.
+
+        :param float timeout: number of seconds the plugin waits for the chunk
+        :param int stream_id: id of the stream, as sent with the iterator
+        :param int size: max number of items to read. Defaults to the configured chunk size.
+
+        :returns: (kind, payload, done) where kind and payload are the packed list of items read and done is
+        whether the iterator is exhausted
+        :rtype: tuple
 
+        :raises KeyError: if the stream does not exist (anymore)
+        :raises TimeoutError: if the plugin stopped waiting before the chunk could be read
+        """
+        with _deadline(timeout):
+            _check_deadline()
+            return self.next_chunk(stream_id, size)
+
+    def close_stream(self, stream_id):
+        """
+        Endpoint to drop an iterator before it is exhausted.
+
+        :param int stream_id: id of the stream, as sent with the iterator
+        """
+        _streams.close(stream_id)
+
+    def ref_getattr(self, ref_id, attr):
+        """
+        Endpoint to read an attribute of an object held in the core for the plugin.
+
+        :param int ref_id: id of the reference, as sent with the handle
+        :param str attr: name of the attribute
+
+        :returns: (kind, payload, None) where kind and payload are the packed value of the attribute
+        :rtype: tuple
+
+        :raises KeyError: if the reference does not exist (anymore)
+        """
+        with _owned_by(self.caller):
+            return _pack(getattr(_refs.get(ref_id), attr)) + (None,)
+
+    def ref_getattr_until(self, timeout, ref_id, attr):
+        """
+        Endpoint to read an attribute of an object held in the core for the plugin, unless the plugin already
+        stopped waiting for it.
+
+        :param float timeout: number of seconds the plugin waits for the attribute
+        :param int ref_id: id of the reference, as sent with the handle
+        :param str attr: name of the attribute
+
+        :returns: (kind, payload, None) where kind and payload are the packed value of the attribute
+        :rtype: tuple
+
+        :raises KeyError: if the reference does not exist (anymore)
+        :raises TimeoutError: if the plugin stopped waiting before the attribute could be read
+        """
+        with _deadline(timeout):
+            _check_deadline()
+            return self.ref_getattr(ref_id, attr)
+
+    def ref_call(self, ref_id, method, *args, **kwargs):
+        """
+        Endpoint to call a method of an object held in the core for the plugin.
+
+        :param int ref_id: id of the reference, as sent with the handle
+        :param str method: name of the method
+        :param args: args to forward
+        :param kwargs: kwargs to forward
+
+        :returns: (kind, payload, None) where kind and payload are the packed return of the method
+        :rtype: tuple
+
+        :raises KeyError: if the reference does not exist (anymore)
+        """
+        with _owned_by(self.caller):
+            return _pack(self._call(getattr(_refs.get(ref_id), method), *args, **kwargs)) + (None,)
+
+    def ref_call_until(self, timeout, ref_id, method, *args, **kwargs):
+        """
+        Endpoint to call a method of an object held in the core for the plugin, with a deadline.
+
+        :param float timeout: number of seconds the plugin waits for the call
+        :param int ref_id: id of the reference, as sent with the handle
+        :param str method: name of the method
+        :param args: args to forward
+        :param kwargs: kwargs to forward
+
+        :returns: (kind, payload, None) where kind and payload are the packed return of the method
+        :rtype: tuple
+
+        :raises KeyError: if the reference does not exist (anymore)
+        :raises TimeoutError: if the call did not complete before the deadline
+        """
+        with _deadline(timeout):
+            return self.ref_call(ref_id, method, *args, **kwargs)
+
+    def ref_release(self, ref_id):
+        """
+        Endpoint to drop a handle to an object held in the core, releasing the object if it was the last one.
+
+        :param int ref_id: id of the reference, as sent with the handle
+        """
+        _refs.release(ref_id)
+
+    def manifest(self):
+        """
+        Endpoint describing every skill registered in the core.
+
+        :returns: the current skill generation and the description of each skill by dotted name, being
+        whether it is callable and its signature if it can be determined
+        :rtype: tuple(int, dict[str, tuple(bool, str|None)])
+        """
+        return aigis._AIGISmanifest()
+
+    def _execute(self, pseq, args, kwargs):
+        """
+        Resolve and, if callable, call the value at the end of a point sequence.
+
+        :param list[str] pseq: point sequence in mainc to follow
+        :param tuple args: args to forward
+        :param dict kwargs: kwargs to forward
+
+        :returns: (kind, payload, generation) where kind and payload are the packed result of final layer,
+        or "ref" and a handle to it for skills returning by reference, and generation is the skill generation
+        the value was read at if it is a constant, None otherwise
+        :rtype: tuple
+
+        :raises TypeError: if the arguments do not match the requested function's signature.
+        """
+        start = time.perf_counter()
+        # Read before resolving, so a change happening meanwhile makes the constant look older, not newer
+        generation = aigis._AIGISgeneration
+        name = ".".join(pseq)
+        record = aigis._AIGISregistry.get(name)
+        reply = None
+        # Streams and references are tied to the connection if the server has one per plugin, to the plugin's
+        # name otherwise. Encoders are only handed the value, so they read it from the context
+        owner = _streams.OWNER.set(_streams.OWNER.get() or self.caller)
+        try:
+            if record is None:
+                # Not a registered skill name, such as a module member or one of the AIGIS builtins
+                toret = self._recurpseq(pseq, 0, aigis)
+            else:
+                toret = record.skill
+            if callable(toret):
+                if record is not None and record.coalesced:
+                    # Identical calls waiting on another don't need a slot of their own
+                    result = _coalesce.call(
+                        name,
+                        functools.partial(self._call, toret),
+                        functools.partial(self._call_shared, toret),
+                        args,
+                        kwargs,
+                        DEADLINE.get()
+                    )
+                else:
+                    result = self._call(toret, *args, **kwargs)
+                if record is not None and record.referenced:
+                    reply = ("ref", _refs.share(result, _streams.OWNER.get()), None)
+                else:
+                    reply = _pack(result) + (None,)
+            elif args or kwargs:
+                raise TypeError("Too many arguments:\n%s\n%s" % (args, kwargs))
+            else:
+                reply = _pack(toret) + (generation,)
+        finally:
+            _streams.OWNER.reset(owner)
+            _stats.record(
+                name,
+                self.caller,
+                time.perf_counter() - start,
+                error=reply is None,
+                request_bytes=_stats.request_size(args, kwargs, REQUEST_BYTES.get()),
+                response_bytes=_stats.reply_size(reply) if reply else 0
+            )
+        PROFILER.first_call(self.caller)
+        return reply
+
+    def _call(self, skill, *args, **kwargs):
+        """
+        Call a skill once the caller's turn comes, if calls are scheduled, and before the deadline of the
+        call, if it has one.
+
+        :param callable skill: the skill to call
+        :param args: args to forward
+        :param kwargs: kwargs to forward
+
+        :returns: the return of the skill
+        :rtype: object
+
+        :raises TimeoutError: if the call did not complete before its deadline
+        """
+        deadline = DEADLINE.get()
+        if deadline is None:
+            if self.scheduler is None:
+                return skill(*args, **kwargs)
+            with self.scheduler.slot(self.caller):
+                return skill(*args, **kwargs)
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError("The plugin stopped waiting before the call could start.")
+        if self.scheduler is None:
+            result = skill(*args, **kwargs)
+        else:
+            with self.scheduler.slot(self.caller, left) as granted:
+                if not granted:
+                    raise TimeoutError("The plugin stopped waiting before the call could start.")
+                result = skill(*args, **kwargs)
+        if time.monotonic() > deadline:
+            # Nobody is waiting for it anymore
+            if isinstance(result, Iterator) and hasattr(result, "close"):
+                result.close()
+            raise TimeoutError("The call completed after the plugin stopped waiting.")
+        return result
+
+    def _call_shared(self, skill, *args, **kwargs):
+        """
+        Call a skill on behalf of every identical call waiting on it, so without the deadline of the call
+        running it.
+
+        :param callable skill: the skill to call
+        :param args: args to forward
+        :param kwargs: kwargs to forward
+
+        :returns: the return of the skill
+        :rtype: object
+        """
+        token = DEADLINE.set(None)
+        try:
+            return self._call(skill, *args, **kwargs)
+        finally:
+            DEADLINE.reset(token)
 
     def _recurpseq(self, pseq, i, mod):
         """
@@ -53,12 +380,185 @@ class AIGISpseq():
         return self._recurpseq(pseq, i+1, getattr(mod, pseq[i]))
 
 
+@contextlib.contextmanager
+def _deadline(timeout):
+    """
+    Set the deadline of the calls made in the context, counting from when the request was received.
+
+    :param float timeout: number of seconds the plugin waits
+    """
+    token = DEADLINE.set((RECEIVED.get() or time.monotonic()) + timeout)
+    try:
+        yield
+    finally:
+        DEADLINE.reset(token)
+
+
+@contextlib.contextmanager
+def _owned_by(caller):
+    """
+    Tie the streams and references opened in the context to the plugin's connection, if the server has one
+    per plugin, and to the plugin's name otherwise.
+
+    :param str caller: name of the plugin making the call
+    """
+    token = _streams.OWNER.set(_streams.OWNER.get() or caller)
+    try:
+        yield
+    finally:
+        _streams.OWNER.reset(token)
+
+
+def _check_deadline():
+    """
+    :raises TimeoutError: if the deadline of the current call passed
+    """
+    deadline = DEADLINE.get()
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError("The plugin stopped waiting before the call could start.")
+
+
+def _pack(value):
+    """
+    Prepare the result of a call for transfer to the plugin. Encoders are tried in order and the first one
+    accepting the value is used. If none does, the value is left to the connection's dill serialization.
+    The plugin unpacks it according to its kind:
+    - "iter": the id of a stream holding an iterator, with the first chunk of items
+    - "shm": a handle to a shared memory segment holding a large buffer
+    - "p5": the value pickled by the stdlib with protocol 5, for builtin types
+    - "obj": the value itself, serialized with the connection
+
+    :param object value: the result to transfer
+
+    :returns: (kind, payload)
+    :rtype: tuple
+    """
+    for kind, encoder in ENCODERS:
+        payload = encoder(value)
+        if payload is not None:
+            return (kind, payload)
+    # This allows the custom dill package to properly regenerate all the needed properties client-side
+    if type(value).__module__ != "builtins":
+        type(value).__module__ = "__main__"
+    return ("obj", value)
+
+
+def _stream(value):
+    """
+    Stream iterators to the plugin rather than trying to serialize them. The first chunk is sent right away.
+
+    :param object value: the result to transfer
+
+    :returns: (stream id, packed first chunk, whether the iterator is exhausted), or None if the value is
+    not an iterator
+    :rtype: tuple|None
+    """
+    if not isinstance(value, Iterator):
+        return None
+    stream_id = _streams.open_stream(value)
+    chunk, done = _streams.read(stream_id)
+    return (stream_id, _pack(chunk), done)
+
+
+# (kind, encoder) pairs, in order of preference. An encoder returns None if it can't handle the value.
+# Each kind must have a matching decoder in the injector.
+ENCODERS = [
+    ("iter", _stream),
+    ("shm", _shm.share),
+    ("p5", _codecs.encode_builtin)
+]
+
+
 class WrapManager(SyncManager):
     """Wrapper around the multiprocessing manager because classmethods."""
 # Register our pseq parsing wrapper class
 WrapManager.register("get_aigis", callable=AIGISpseq)
 
-# The Manager object. Runs on localhost:50000
-WM = WrapManager(address=("0.0.0.0", 50000), authkey=b"aigis")
-# Create a thread for serving the server, since it's blocking.
-CORE_SERVER = Thread(target=WM.get_server().serve_forever, daemon=True)
+
+def serve(config):
+    """
+    Start the RPC servers. The TCP manager server is always started, so that plugins on remote hosts can
+    reach the core. Internal plugins running on this host can instead be served over a unix domain socket,
+    and by the event loop server rather than a manager server, if requested in the config. Since the TCP
+    port is taken, the event loop server listens on its own port on localhost when serving over TCP.
+
+    :param dict config: the rpc section of the AIGIS config
+    """
+    global LOCAL_ADDRESS, LOCAL_SERVER, SCHEDULER  #pylint: disable=global-statement
+    _shm.THRESHOLD = config.get("shared_memory_threshold", _shm.THRESHOLD)
+    _streams.CHUNK_SIZE = config.get("stream_chunk_size", _streams.CHUNK_SIZE)
+    if config.get("stats_interval", 0):
+        _stats.log_periodically(config["stats_interval"])
+    atexit.register(_shm.cleanup)
+    server = config.get("server", "manager")
+    address = TCP_ADDRESS
+    if config.get("local_transport", "tcp") == "unix":
+        address = os.path.abspath(config.get("socket", DEFAULT_SOCKET))
+        # A socket file left behind by a previous run would prevent binding
+        if os.path.exists(address):
+            os.remove(address)
+    elif server == "asyncio":
+        address = ("127.0.0.1", config.get("asyncio_port", ASYNCIO_PORT))
+    if server == "asyncio":
+        from proxinator import _aioserver
+        workers = config.get("workers", _aioserver.WORKERS)
+        # Calls are always queued fairly before reaching the workers
+        SCHEDULER = _scheduler.from_config(config, workers)
+        _aioserver.serve(address, workers)
+    else:
+        SCHEDULER = _scheduler.from_config(config)
+        if address != TCP_ADDRESS:
+            _serve_on(address)
+    # Started last, so that every connection sees the scheduler
+    _serve_on(TCP_ADDRESS)
+    LOCAL_ADDRESS = address
+    LOCAL_SERVER = server
+    LOG.boot("Local plugins will connect to the %s server on %s", server, format_address(LOCAL_ADDRESS))
+
+
+def _serve_on(address):
+    """
+    Start a manager server on the given address.
+
+    :param tuple|str address: (host, port) for TCP or a file path for a unix domain socket
+    """
+    manager = WrapManager(address=address, authkey=AUTHKEY)
+    server = Thread(target=manager.get_server().serve_forever, daemon=True)
+    server.start()
+    CORE_SERVERS.append(server)
+
+
+def format_address(address):
+    """
+    Format an RPC address to be passed to a plugin subprocess on the command line.
+
+    :param tuple|str address: (host, port) for TCP or a file path for a unix domain socket
+
+    :returns: "host:port" for TCP, the socket path otherwise
+    :rtype: str
+    """
+    if isinstance(address, tuple):
+        return "%s:%s" % address
+    return address
+
+
+AUTHKEY = b"aigis"
+# Remote plugins always connect over TCP. Runs on localhost:50000
+TCP_ADDRESS = ("0.0.0.0", 50000)
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), "aigis.sock")
+# Port of the event loop server, when it serves local plugins over TCP.
+ASYNCIO_PORT = 50001
+# Address handed to internal plugins running on this host. Replaced by the socket path when serving over unix.
+LOCAL_ADDRESS = TCP_ADDRESS
+# Kind of server handed to internal plugins running on this host, "manager" or "asyncio".
+LOCAL_SERVER = "manager"
+# Threads serving the servers.
+CORE_SERVERS = []
+# Scheduler of the calls to skills, if any scheduling is configured.
+SCHEDULER = None
+# Deadline of the call being executed, in time.monotonic() seconds, if the plugin set one.
+DEADLINE = contextvars.ContextVar("DEADLINE", default=None)
+# When the call being executed was received, if it was queued before being executed.
+RECEIVED = contextvars.ContextVar("RECEIVED", default=None)
+# Size in bytes of the request of the call being executed, if the server received it as a single call.
+REQUEST_BYTES = contextvars.ContextVar("REQUEST_BYTES", default=None)
@@ -0,0 +1,314 @@
+"""
+Event loop based RPC server for internal plugins running on this host.
+
+The manager server spawns a thread per connection and keeps proxy bookkeeping for each, so dozens of plugins
+making calls from several threads end up as many mostly idle threads contending for the GIL. This server
+handles every connection in the AIGIS event loop and hands the skill calls to a bounded pool of workers.
+Connections are multiplexed: plugins tag each request with an id and replies are sent back as soon as they
+are ready, in any order, so a single connection serves all the threads and coroutines of a plugin.
+
+Frames are the size of the payload as 4 bytes big endian, followed by the payload. A connection opens with a
+challenge: the server sends a random nonce, which the plugin answers with its HMAC under the auth key followed
+by the plugin's name. Requests are then (request id, endpoint, args, kwargs) and replies (request id, success,
+result or raised exception), serialized the same way the manager server does.
+"""
+import os
+import hmac
+import struct
+import time
+import socket
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from multiprocess.reduction import ForkingPickler
+
+from utils.log_utils import LOG  #pylint: disable=no-name-in-module
+from plugins.PluginIO import ALOOP
+from proxinator import _streams, _refs, _aigis
+from proxinator._aigis import AIGISpseq, AUTHKEY
+import aigis
+
+# Default number of workers executing skills.
+WORKERS = 16
+# Seconds a plugin has to answer the challenge.
+HANDSHAKE_TIMEOUT = 10
+
+_HEADER = struct.Struct(">I")
+_NONCE_SIZE = 32
+_DIGEST = "sha256"
+# Endpoints plugins can call, the same ones the manager server exposes.
+_ENDPOINTS = frozenset(
+    name for name in dir(AIGISpseq) if not name.startswith("_") and callable(getattr(AIGISpseq, name))
+)
+# Endpoints making a single call, whose request is measured as received for the stats.
+_SINGLE_CALL_ENDPOINTS = frozenset(["parse_pseq", "parse_pseq_until"])
+# Endpoints which wait on the event loop rather than holding a worker.
+_LOOP_ENDPOINTS = frozenset(["wait_invalidation"])
+
+_WORKERS = None
+# Future resolved on the next skill change, shared by every plugin waiting for one.
+_CHANGED = None
+# Servers currently listening.
+SERVERS = []
+
+
+class _Connection():
+    """
+    A plugin connected to the server. Streams opened and objects held by its calls are tied to it and released
+    when the plugin goes away.
+
+    :param asyncio.StreamWriter writer: writer of the connection
+    :param str caller: name of the plugin
+    """
+    def __init__(self, writer, caller):
+        self.writer = writer
+        self.pseq = AIGISpseq(caller)
+        # Requests are scheduled before reaching the workers instead
+        self.pseq.scheduler = None
+        # Keep a reference to the requests waiting on the event loop, or they could be garbage collected
+        self.tasks = set()
+
+    def dispatch(self, frame):
+        """
+        Hand a request to the workers, once the plugin's turn comes. Called from the event loop.
+
+        :param bytes frame: the request as received
+        """
+        scheduler = _aigis.SCHEDULER
+        received = time.monotonic()
+        if scheduler is None:
+            _WORKERS.submit(self._run, frame, received)
+        else:
+            scheduler.submit(
+                self.pseq.caller, functools.partial(_WORKERS.submit, self._run_scheduled, frame, received)
+            )
+
+    def _run_scheduled(self, frame, received):
+        """
+        Run a request which holds a slot of the scheduler, releasing it once done.
+
+        :param bytes frame: the request as received
+        :param float received: when the request was received, for its deadline to count the time queued
+        """
+        try:
+            self._run(frame, received)
+        finally:
+            _aigis.SCHEDULER.release(self.pseq.caller)
+
+    def _run(self, frame, received):
+        """
+        Decode a request, execute it and send its reply. Runs on a worker, so that neither (de)serialization
+        nor skills block the event loop.
+
+        :param bytes frame: the request as received
+        :param float received: when the request was received, for its deadline to count the time queued
+        """
+        request_id = None
+        try:
+            request_id, endpoint, args, kwargs = ForkingPickler.loads(frame)
+            if endpoint not in _ENDPOINTS:
+                raise AttributeError("No endpoint %s on the AIGIS core." % endpoint)
+            if endpoint in _LOOP_ENDPOINTS:
+                ALOOP.call_soon_threadsafe(self._run_on_loop, request_id, endpoint, args, kwargs)
+                return
+            token = _streams.OWNER.set(self)
+            received_token = _aigis.RECEIVED.set(received)
+            size_token = _aigis.REQUEST_BYTES.set(len(frame) if endpoint in _SINGLE_CALL_ENDPOINTS else None)
+            try:
+                reply = (request_id, True, getattr(self.pseq, endpoint)(*args, **kwargs))
+            finally:
+                _aigis.REQUEST_BYTES.reset(size_token)
+                _aigis.RECEIVED.reset(received_token)
+                _streams.OWNER.reset(token)
+        except Exception as e:  #pylint: disable=broad-except
+            reply = (request_id, False, e)
+        ALOOP.call_soon_threadsafe(self._send, _encode(reply))
+
+    def _run_on_loop(self, request_id, endpoint, args, kwargs):
+        """
+        Execute a request waiting on the event loop rather than on a worker. Called from the event loop.
+
+        :param int request_id: id of the request
+        :param str endpoint: name of the endpoint called
+        :param tuple args: args of the call
+        :param dict kwargs: kwargs of the call
+        """
+        async def _wait():
+            try:
+                reply = (request_id, True, await _LOOP_HANDLERS[endpoint](*args, **kwargs))
+            except Exception as e:  #pylint: disable=broad-except
+                reply = (request_id, False, e)
+            self._send(_encode(reply))
+        task = ALOOP.create_task(_wait())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    def _send(self, reply):
+        """
+        Send a reply, unless the plugin went away while the request was running. Called from the event loop.
+
+        :param memoryview reply: the encoded reply
+        """
+        if not self.writer.is_closing():
+            self.writer.write(_HEADER.pack(len(reply)))
+            self.writer.write(reply)
+
+    def close(self):
+        """
+        Release what the plugin left behind once it's gone.
+        """
+        _streams.release_owner(self)
+        _refs.release_owner(self)
+        self.writer.close()
+
+
+def _encode(reply):
+    """
+    Serialize a reply. Replies which can't be serialized are replaced by the error preventing it.
+
+    :param tuple reply: (request id, success, result or raised exception)
+
+    :returns: the serialized reply
+    :rtype: memoryview
+    """
+    try:
+        return ForkingPickler.dumps(reply)
+    except Exception as e:  #pylint: disable=broad-except
+        return ForkingPickler.dumps((reply[0], False, RuntimeError(
+            "Could not send the result of the call to the plugin: %r" % e
+        )))
+
+
+async def _read_frame(reader):
+    """
+    :param asyncio.StreamReader reader: reader of the connection
+
+    :returns: the next frame received
+    :rtype: bytes
+
+    :raises asyncio.IncompleteReadError: if the connection closes
+    """
+    size, = _HEADER.unpack(await reader.readexactly(_HEADER.size))
+    return await reader.readexactly(size)
+
+
+async def _handshake(reader, writer):
+    """
+    Challenge a new connection to prove it knows the auth key.
+
+    :param asyncio.StreamReader reader: reader of the connection
+    :param asyncio.StreamWriter writer: writer of the connection
+
+    :returns: the name of the plugin, or None if the challenge failed
+    :rtype: str|None
+    """
+    nonce = os.urandom(_NONCE_SIZE)
+    writer.write(_HEADER.pack(len(nonce)) + nonce)
+    answer = await _read_frame(reader)
+    expected = hmac.new(AUTHKEY, nonce, _DIGEST).digest()
+    if not hmac.compare_digest(answer[:len(expected)], expected):
+        return None
+    writer.write(_HEADER.pack(2) + b"OK")
+    await writer.drain()
+    return answer[len(expected):].decode() or "unknown"
+
+
+async def _serve_connection(reader, writer):
+    """
+    Serve a plugin until it disconnects.
+
+    :param asyncio.StreamReader reader: reader of the connection
+    :param asyncio.StreamWriter writer: writer of the connection
+    """
+    sock = writer.get_extra_info("socket")
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+        # Replies are written whole, waiting to coalesce them only delays the plugin
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    try:
+        caller = await asyncio.wait_for(_handshake(reader, writer), HANDSHAKE_TIMEOUT)
+    except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, UnicodeDecodeError):
+        caller = None
+    if caller is None:
+        LOG.warning("Refused an RPC connection which failed authentication.")
+        writer.close()
+        return
+    connection = _Connection(writer, caller)
+    try:
+        while True:
+            connection.dispatch(await _read_frame(reader))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        connection.close()
+
+
+def _notify_change():
+    """
+    Wake up the plugins waiting for the skills to change. Called from whichever thread changed them.
+    """
+    ALOOP.call_soon_threadsafe(_resolve_change)
+
+
+def _resolve_change():
+    """
+    Resolve the future plugins wait on for changes. Called from the event loop.
+    """
+    global _CHANGED  #pylint: disable=global-statement
+    if _CHANGED is not None and not _CHANGED.done():
+        _CHANGED.set_result(None)
+    _CHANGED = None
+
+
+async def _wait_invalidation(generation, timeout):
+    """
+    Event loop version of AIGISpseq.wait_invalidation, so that plugins waiting for changes don't each hold a
+    worker.
+
+    :param int generation: last skill generation known by the plugin
+    :param float timeout: max number of seconds to wait for a change
+
+    :returns: the current generation and the top level names that changed since the plugin's generation, or
+    None if everything should be considered changed
+    :rtype: tuple(int, list[str]|None)
+    """
+    global _CHANGED  #pylint: disable=global-statement
+    if aigis._AIGISgeneration == generation:
+        if _CHANGED is None:
+            _CHANGED = ALOOP.create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(_CHANGED), timeout)
+        except asyncio.TimeoutError:
+            pass
+    return aigis._AIGISwaitchange(generation, 0)
+
+
+_LOOP_HANDLERS = {
+    "wait_invalidation": _wait_invalidation
+}
+
+
+async def _start(address):
+    """
+    Start listening on an address. Called from the event loop.
+
+    :param tuple|str address: (host, port) for TCP or a file path for a unix domain socket
+    """
+    if isinstance(address, tuple):
+        server = await asyncio.start_server(_serve_connection, *address)
+    else:
+        server = await asyncio.start_unix_server(_serve_connection, address)
+    SERVERS.append(server)
+
+
+def serve(address, workers=WORKERS):
+    """
+    Start serving plugins on an address, in the AIGIS event loop.
+
+    :param tuple|str address: (host, port) for TCP or a file path for a unix domain socket
+    :param int workers: max number of skills executed at once
+    """
+    global _WORKERS  #pylint: disable=global-statement
+    if _WORKERS is None:
+        _WORKERS = ThreadPoolExecutor(workers, thread_name_prefix="aigis-rpc")
+        aigis._AIGISwatchers.append(_notify_change)
+    asyncio.run_coroutine_threadsafe(_start(address), ALOOP).result()
@@ -0,0 +1,82 @@
+"""
+Share a single execution between identical calls to a skill made at the same time.
+
+When several plugins ask an expensive skill the same thing at once, only the first call runs the skill, and
+the calls arriving while it runs wait for its result instead of running it again. Nothing is kept once the
+call is done, the next identical call runs the skill again. Skills opt in by being listed in
+COALESCED_SKILLS in their core file.
+"""
+import time
+import threading
+from collections.abc import Iterator
+
+from plugins.core.Skills import call_key  #pylint: disable=import-error
+
+_FLIGHTS = {}
+_FLIGHTS_LOCK = threading.Lock()
+
+
+class _Flight():
+    """
+    A call in progress, which identical calls can wait on.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.shared = False
+
+
+def call(name, skill, shared, args, kwargs, deadline=None):
+    """
+    Call a skill, or wait for the result of an identical call already in progress.
+    The execution shared by identical calls runs without a deadline, since it is not any single caller's, and
+    each caller gives up on it at its own deadline. Iterators returned can't be shared, so the calls which
+    waited on one run the skill themselves.
+
+    :param str name: dotted name of the skill
+    :param callable skill: runs the skill with the given arguments for this call alone
+    :param callable shared: runs the skill with the given arguments for every identical call, without deadline
+    :param tuple args: the skill's args
+    :param dict kwargs: the skill's kwargs
+    :param float deadline: time.monotonic() after which the caller stops waiting, None to wait until done
+
+    :returns: the return of the skill
+    :rtype: object
+
+    :raises TimeoutError: if the call did not complete before its deadline
+    :raises Exception: whatever the skill raised
+    """
+    key = call_key(args, kwargs)
+    if key is None:
+        return skill(*args, **kwargs)
+    key = (name, key)
+    with _FLIGHTS_LOCK:
+        flight = _FLIGHTS.get(key)
+        leader = flight is None
+        if leader:
+            flight = _FLIGHTS[key] = _Flight()
+    if not leader:
+        if not flight.done.wait(None if deadline is None else max(0, deadline - time.monotonic())):
+            raise TimeoutError("The plugin stopped waiting for an identical call in progress.")
+        if flight.error is not None:
+            raise flight.error
+        if flight.shared:
+            return flight.result
+        return skill(*args, **kwargs)
+    try:
+        flight.result = shared(*args, **kwargs)
+        flight.shared = not isinstance(flight.result, Iterator)
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _FLIGHTS_LOCK:
+            del _FLIGHTS[key]
+        flight.done.set()
+    if deadline is not None and time.monotonic() > deadline:
+        # Nobody is waiting for it anymore, but the calls which waited on it still get it
+        if not flight.shared and hasattr(flight.result, "close"):
+            flight.result.close()
+        raise TimeoutError("The call completed after the plugin stopped waiting.")
+    return flight.result
@@ -0,0 +1,66 @@
+"""
+Serialization codecs used to pack skill results before they are sent to plugins.
+
+The manager connection serializes everything with the patched dill, which goes through dill's pure python
+object graph machinery even for a plain dict. Results made only of builtin types don't need any of that and
+can be encoded with the stdlib's C pickler instead, leaving a single bytes object for dill to send.
+Checking that a value is only made of builtin types needs reducer_override, so before python 3.8 every
+result goes through dill.
+"""
+import io
+import sys
+import pickle
+
+PROTOCOL = min(5, pickle.HIGHEST_PROTOCOL)
+# Pickler.reducer_override is only called from python 3.8, the check would silently let anything through.
+SUPPORTED = sys.version_info >= (3, 8)
+
+# Builtin types the C pickler may hand to reducer_override, which are still safe to pickle as usual.
+_BUILTIN_TYPES = (type(None), bool, int, float, complex, str, bytes, bytearray, list, tuple, dict, set,
+                  frozenset, range, slice)
+
+
+class _NotBuiltin(Exception):
+    """
+    Raised when the value being encoded contains anything other than builtin types.
+    """
+
+
+class _BuiltinPickler(pickle.Pickler):
+    """
+    Pickler refusing anything that isn't an instance of a builtin type. This includes classes and functions,
+    which pickle would otherwise save by reference, and which can't be resolved in the plugin's runtime.
+    """
+    def reducer_override(self, obj):
+        """
+        Called by the C pickler for every object other than the most common builtins.
+
+        :param object obj: object about to be pickled
+
+        :returns: NotImplemented to let the pickler handle builtin types normally
+        :rtype: NotImplementedType
+
+        :raises _NotBuiltin: if the object is not an instance of a builtin type
+        """
+        if type(obj) in _BUILTIN_TYPES:
+            return NotImplemented
+        raise _NotBuiltin()
+
+
+def encode_builtin(value):
+    """
+    Pickle a value made only of builtin types using the stdlib pickler.
+
+    :param object value: the value to encode
+
+    :returns: the pickled value, or None if the value requires dill
+    :rtype: bytes|None
+    """
+    if not SUPPORTED:
+        return None
+    buf = io.BytesIO()
+    try:
+        _BuiltinPickler(buf, protocol=PROTOCOL).dump(value)
+    except (_NotBuiltin, pickle.PicklingError, RecursionError):
+        return None
+    return buf.getvalue()
@@ -0,0 +1,257 @@
+"""
+Run the CPU heavy skills of core plugins in worker processes.
+
+All core skills run inside the core process, so a CPU bound skill called by one plugin stalls the calls of
+every other plugin behind the GIL. Core plugins can list such skills in PROCESS_SKILLS in their core file,
+alongside SKILLS. Each plugin listing some gets its own pool of worker processes, started with its core file
+already imported, and calls to those skills are sent to the pool instead of running in the core.
+
+Workers are spawned rather than forked, since the core process runs many threads. They import the core file
+again, so anything done at import time is done in each worker too. Process skills can't reach other skills
+through aigis, and their arguments and results must be serializable. Workers failing to import the core file
+fail the plugin's registration, and a worker dying mid-call fails that call and restarts the pool, rather than
+leaving callers waiting forever.
+"""
+import os
+import sys
+import time
+import logging
+import functools
+import multiprocessing
+from threading import Lock
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as _FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import exc_utils
+
+# Default number of worker processes per plugin, unless the core file sets PROCESS_WORKERS.
+WORKERS = max(1, (os.cpu_count() or 2) // 2)
+# Max number of seconds a worker may take to start and import the core file.
+START_TIMEOUT = 60
+
+# Pools by plugin name.
+_POOLS = {}
+# Skills of the core file, by dotted name. Only set in workers.
+_SKILLS = {}
+
+
+class ProcessSkill():
+    """
+    Callable registered in place of a process skill, sending calls to the plugin's pool.
+    Looks like the skill it replaces, so that its signature can still be described to plugins.
+
+    :param _Pool pool: the plugin's pool
+    :param str name: dotted name of the skill in the core file
+    :param callable skill: the skill as registered in the core
+    """
+    def __init__(self, pool, name, skill):
+        self.pool = pool
+        self.name = name
+        functools.update_wrapper(self, skill)
+
+    def __call__(self, *args, **kwargs):
+        """
+        Run the skill in a worker, blocking until it is done or the deadline of the call passes.
+
+        :param args: the skill's args
+        :param kwargs: the skill's kwargs
+
+        :returns: the return of the skill
+        :rtype: object
+
+        :raises TimeoutError: if the skill did not complete before the deadline of the call
+        :raises BrokenProcessPool: if the worker running the skill died
+        """
+        from proxinator._aigis import DEADLINE
+        deadline = DEADLINE.get()
+        return self.pool.call(self.name, args, kwargs, None if deadline is None else deadline - time.monotonic())
+
+
+class _Pool():
+    """
+    The pool of worker processes of a plugin. A worker dying breaks the whole pool, so a broken pool is
+    replaced by a new one, failing only the calls which were running in it.
+
+    :param AigisPlugin plugin: the plugin
+    :param int workers: number of worker processes
+    :param tuple initargs: args of _init
+    """
+    def __init__(self, plugin, workers, initargs):
+        self.log = plugin.log
+        self.workers = workers
+        self.initargs = initargs
+        self._lock = Lock()
+        self.executor = self._executor()
+
+    def _executor(self):
+        """
+        :returns: a new pool of workers, spawned rather than forked
+        :rtype: ProcessPoolExecutor
+        """
+        return ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init, initargs=self.initargs
+        )
+
+    def check(self):
+        """
+        Make sure workers can start, importing the core file without error.
+
+        :raises ProcessPoolError: if a worker fails to start
+        """
+        try:
+            self.executor.submit(_ready).result(START_TIMEOUT)
+        except BrokenProcessPool:
+            raise ProcessPoolError(
+                "Worker processes failed to import the core file. Check the core's output for the error."
+            ) from None
+        except _FutureTimeoutError:
+            raise ProcessPoolError(
+                "Worker processes did not start within %s seconds." % START_TIMEOUT
+            ) from None
+
+    def call(self, name, args, kwargs, timeout=None):
+        """
+        Run a process skill in a worker.
+
+        :param str name: dotted name of the skill
+        :param tuple args: the skill's args
+        :param dict kwargs: the skill's kwargs
+        :param float timeout: max number of seconds to wait for the skill, None to wait until it is done
+
+        :returns: the return of the skill
+        :rtype: object
+
+        :raises TimeoutError: if the skill did not complete in time
+        :raises BrokenProcessPool: if the worker running the skill died
+        """
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("The plugin stopped waiting before the call could start.")
+        executor = self.executor
+        if executor is None:
+            raise BrokenProcessPool("The worker processes of the plugin were stopped.")
+        try:
+            future = executor.submit(_call, name, args, kwargs)
+            return future.result(timeout)
+        except BrokenProcessPool:
+            self._replace(executor)
+            raise
+        except _FutureTimeoutError:
+            # The worker can't be interrupted, it will only be free once the skill is done
+            future.cancel()
+            raise TimeoutError("The call did not complete before the plugin stopped waiting.") from None
+
+    def _replace(self, broken):
+        """
+        Replace a broken pool with a new one, unless that was already done or the pool was stopped.
+
+        :param ProcessPoolExecutor broken: the broken pool
+        """
+        with self._lock:
+            if self.executor is not broken:
+                return
+            self.log.warning("A worker process died, restarting worker processes...")
+            self.executor = self._executor()
+        broken.shutdown(wait=False)
+
+    def shutdown(self):
+        """
+        Terminate the workers, failing the calls running in them.
+        """
+        with self._lock:
+            executor, self.executor = self.executor, None
+        if executor is None:
+            return
+        # Workers busy with a skill would otherwise run it to completion
+        processes = list((executor._processes or {}).values())  #pylint: disable=protected-access
+        if sys.version_info >= (3, 9):
+            executor.shutdown(wait=False, cancel_futures=True)
+        else:
+            # Calls still queued fail once the workers are gone, the pool then being broken
+            executor.shutdown(wait=False)
+        for process in processes:
+            process.terminate()
+
+
+def _init(plugin_name, entrypoint, core_file, names):
+    """
+    Import the core file in a new worker and decorate its process skills like the core does.
+
+    :param str plugin_name: name of the plugin
+    :param str entrypoint: entrypoint of the plugin, for the core file's imports
+    :param str core_file: path to the core file
+    :param list[str] names: dotted names of the process skills
+    """
+    from utils import mod_utils  #pylint: disable=import-error
+    from plugins.core.Skills import decorator  #pylint: disable=import-error
+    sys.path.append(entrypoint)
+    mod = mod_utils.import_from_path(core_file)
+    log = logging.getLogger(plugin_name)
+    for name in names:
+        skill = mod
+        for attr in name.split("."):
+            skill = getattr(skill, attr)
+        _SKILLS[name] = decorator(skill, log)
+
+
+def _ready():
+    """
+    Nothing to do, for checking that a worker started.
+    """
+
+
+def _call(name, args, kwargs):
+    """
+    Run a process skill in a worker.
+
+    :param str name: dotted name of the skill
+    :param tuple args: the skill's args
+    :param dict kwargs: the skill's kwargs
+
+    :returns: the return of the skill
+    :rtype: object
+    """
+    return _SKILLS[name](*args, **kwargs)
+
+
+def start(plugin, mod, names):
+    """
+    Start the pool of a plugin, replacing any previous one.
+
+    :param AigisPlugin plugin: the plugin
+    :param module mod: the plugin's core file, as imported in the core
+    :param list[str] names: dotted names of the process skills
+
+    :returns: the pool
+    :rtype: _Pool
+
+    :raises ProcessPoolError: if the workers fail to start
+    """
+    stop(plugin)
+    workers = getattr(mod, "PROCESS_WORKERS", WORKERS)
+    pool = _Pool(plugin, workers, (plugin.name, plugin.config.ENTRYPOINT, mod.__file__, names))
+    try:
+        pool.check()
+    except BaseException:
+        pool.shutdown()
+        raise
+    _POOLS[plugin.name] = pool
+    plugin.log.boot("Started %s worker processes for %s process skills...", workers, len(names))
+    return pool
+
+
+def stop(plugin):
+    """
+    Terminate the pool of a plugin, if it has one.
+
+    :param AigisPlugin plugin: the plugin
+    """
+    pool = _POOLS.pop(plugin.name, None)
+    if pool is not None:
+        pool.shutdown()
+        plugin.log.shutdown("Terminated worker processes.")
+
+
+class ProcessPoolError(exc_utils.PluginLoadError):
+    """
+    Error for when the worker processes of a plugin can't be started.
+    """
@@ -0,0 +1,97 @@
+"""
+Keep the results of skills returning by reference in the core, while plugins use them through handles.
+
+Returning a big stateful object copies its whole graph to the plugin on every call, and some objects can't be
+serialized at all. Skills listed in REFERENCE_SKILLS in their core file instead return a handle to their
+result, which stays in the core. Attribute reads and method calls made on the handle are forwarded to the
+object.
+
+References are counted: every handle sent to a plugin holds one, and releases it when the plugin drops the
+handle. An object is released once no handle refers to it anymore, or once its plugin goes away.
+"""
+import itertools
+import threading
+
+_REFS = {}
+_REFS_LOCK = threading.Lock()
+_IDS = itertools.count()
+# Special methods forwarded by handles, on top of public methods.
+_SPECIAL_METHODS = ("__call__", "__len__", "__getitem__", "__iter__", "__contains__")
+
+
+class _Ref():
+    """
+    An object held for a plugin.
+
+    :param object obj: the object
+    :param object owner: what the reference's lifetime is tied to, the plugin's connection or name
+    """
+    def __init__(self, obj, owner):
+        self.obj = obj
+        self.owner = owner
+        self.count = 0
+
+
+def share(obj, owner):
+    """
+    Hold an object for a plugin, adding a reference to it.
+
+    :param object obj: the object to hold
+    :param object owner: what the reference's lifetime is tied to, the plugin's connection or name
+
+    :returns: the id of the reference, the name of the object's type and the methods a handle can forward
+    :rtype: tuple(int, str, list[str])
+    """
+    with _REFS_LOCK:
+        for ref_id, ref in _REFS.items():
+            if ref.obj is obj and ref.owner == owner:
+                break
+        else:
+            ref_id = next(_IDS)
+            ref = _REFS[ref_id] = _Ref(obj, owner)
+        ref.count += 1
+    rtype = type(obj)
+    methods = [
+        name for name in dir(rtype)
+        if (not name.startswith("_") or name in _SPECIAL_METHODS) and callable(getattr(rtype, name, None))
+    ]
+    return (ref_id, rtype.__name__, methods)
+
+
+def get(ref_id):
+    """
+    :param int ref_id: id of the reference
+
+    :returns: the object held
+    :rtype: object
+
+    :raises KeyError: if the reference does not exist (anymore)
+    """
+    with _REFS_LOCK:
+        return _REFS[ref_id].obj
+
+
+def release(ref_id):
+    """
+    Drop a reference to an object, releasing it if it was the last one.
+
+    :param int ref_id: id of the reference
+    """
+    with _REFS_LOCK:
+        ref = _REFS.get(ref_id)
+        if ref is None:
+            return
+        ref.count -= 1
+        if ref.count <= 0:
+            del _REFS[ref_id]
+
+
+def release_owner(owner):
+    """
+    Release every object held for a plugin which went away.
+
+    :param object owner: the plugin's connection or name
+    """
+    with _REFS_LOCK:
+        for ref_id in [ref_id for ref_id, ref in _REFS.items() if ref.owner == owner]:
+            del _REFS[ref_id]
@@ -0,0 +1,189 @@
+"""
+Fair scheduling of the RPC calls of internal plugins.
+
+Without scheduling, calls run as they arrive with no notion of who sent them, so one plugin hammering the
+core can starve the others. The scheduler caps how many calls run at once overall and per plugin, and when
+calls have to wait, gives the next free slot to the plugin which got the least of its share so far. Plugins
+can be given a bigger share than others by raising their priority.
+"""
+import contextlib
+from collections import deque, defaultdict
+from threading import Lock, Event
+
+
+class Scheduler():
+    """
+    Stride scheduler over the pending calls of each plugin. Every time a call of a plugin starts, the
+    plugin's pass advances by the inverse of its priority, and the next call started is always one of the
+    plugin with the lowest pass, among those under their quota. Plugins which were idle start again from the
+    pass of the last call started, so they can't save up a share while idle.
+
+    :param int max_concurrent: max number of calls running at once, 0 for no limit
+    :param dict[str, int] quotas: max number of calls running at once for specific plugins
+    :param int default_quota: max number of calls running at once for other plugins, 0 for no limit
+    :param dict[str, float] priorities: share of specific plugins relative to the others, which have 1
+    """
+    def __init__(self, max_concurrent=0, quotas=None, default_quota=0, priorities=None):
+        self.max_concurrent = max_concurrent
+        self.quotas = quotas or {}
+        self.default_quota = default_quota
+        self.priorities = priorities or {}
+        self._lock = Lock()
+        self._running = 0
+        self._in_flight = defaultdict(int)
+        self._waiting = {}
+        self._pass = {}
+        self._vtime = 0.0
+
+    def submit(self, caller, start):
+        """
+        Queue a call, to be started as soon as the plugin's turn comes. Calls are started on the thread
+        submitting or releasing the slot which lets them run, so starting one must not block.
+
+        :param str caller: name of the plugin making the call
+        :param callable start: starts the call, once it can run
+        """
+        with self._lock:
+            queue = self._waiting.get(caller)
+            if queue is None:
+                queue = self._waiting[caller] = deque()
+                if not self._in_flight[caller]:
+                    self._pass[caller] = max(self._pass.get(caller, 0.0), self._vtime)
+            queue.append(start)
+            ready = self._next()
+        for start_call in ready:
+            start_call()
+
+    def release(self, caller):
+        """
+        Free the slot of a call which finished, starting the next calls waiting if any.
+
+        :param str caller: name of the plugin which made the call
+        """
+        with self._lock:
+            self._running -= 1
+            self._in_flight[caller] -= 1
+            ready = self._next()
+        for start_call in ready:
+            start_call()
+
+    @contextlib.contextmanager
+    def slot(self, caller, timeout=None):
+        """
+        Block until the plugin's turn comes, and hold a slot while in the context. If the turn doesn't come
+        in time the call gives up its place, and the context is entered without a slot.
+
+        :param str caller: name of the plugin making the call
+        :param float timeout: max number of seconds to wait for the turn, None to wait forever
+
+        :returns: whether a slot was granted, as the context value
+        :rtype: bool
+        """
+        waiter = _Waiter(self, caller)
+        self.submit(caller, waiter.grant)
+        # A slot granted right as the call gives up is kept
+        granted = waiter.wait(timeout) or waiter.abandon()
+        try:
+            yield granted
+        finally:
+            if granted:
+                self.release(caller)
+
+    def _next(self):
+        """
+        Pick the calls which can start now. Must be called with the lock held.
+
+        :returns: the calls to start
+        :rtype: list[callable]
+        """
+        ready = []
+        while not self.max_concurrent or self._running < self.max_concurrent:
+            eligible = [caller for caller in self._waiting if self._under_quota(caller)]
+            if not eligible:
+                break
+            caller = min(eligible, key=self._pass.__getitem__)
+            queue = self._waiting[caller]
+            ready.append(queue.popleft())
+            if not queue:
+                del self._waiting[caller]
+            self._vtime = self._pass[caller]
+            self._pass[caller] += 1.0 / self.priorities.get(caller, 1)
+            self._running += 1
+            self._in_flight[caller] += 1
+        return ready
+
+    def _under_quota(self, caller):
+        """
+        :param str caller: name of the plugin
+
+        :returns: whether the plugin can start another call
+        :rtype: bool
+        """
+        quota = self.quotas.get(caller, self.default_quota)
+        return not quota or self._in_flight[caller] < quota
+
+
+class _Waiter():
+    """
+    A call blocking until its turn comes, which can give up waiting.
+
+    :param Scheduler scheduler: the scheduler the call waits on
+    :param str caller: name of the plugin making the call
+    """
+    def __init__(self, scheduler, caller):
+        self.scheduler = scheduler
+        self.caller = caller
+        self._lock = Lock()
+        self._event = Event()
+        self._abandoned = False
+
+    def grant(self):
+        """
+        Let the call start, unless it gave up meanwhile, in which case the slot is passed on right away.
+        """
+        with self._lock:
+            abandoned = self._abandoned
+            self._event.set()
+        if abandoned:
+            self.scheduler.release(self.caller)
+
+    def wait(self, timeout=None):
+        """
+        :param float timeout: max number of seconds to wait, None to wait forever
+
+        :returns: whether the call was granted a slot in time
+        :rtype: bool
+        """
+        return self._event.wait(timeout)
+
+    def abandon(self):
+        """
+        Give up waiting.
+
+        :returns: whether a slot was granted anyway, which the call then holds
+        :rtype: bool
+        """
+        with self._lock:
+            self._abandoned = True
+            return self._event.is_set()
+
+
+def from_config(config, max_concurrent=0):
+    """
+    Build the scheduler described in the rpc config, if any scheduling is requested.
+
+    :param dict config: the rpc section of the AIGIS config
+    :param int max_concurrent: max number of calls running at once, unless set in the config
+
+    :returns: the scheduler, or None if calls can all run as soon as they arrive
+    :rtype: Scheduler|None
+    """
+    max_concurrent = config.get("max_concurrent", max_concurrent)
+    if not (max_concurrent or config.get("quotas") or config.get("default_quota")):
+        return None
+    return Scheduler(
+        max_concurrent,
+        config.get("quotas"),
+        config.get("default_quota", 0),
+        config.get("priorities")
+    )
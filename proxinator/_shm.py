@@ -0,0 +1,88 @@
+"""
+Hand large buffer results over to plugins through shared memory segments rather than through the manager
+connection, where they would get pickled and copied several times on each side.
+
+The core creates the segment and copies the result into it once. The plugin copies it out once and unlinks
+the segment, which releases it. Segments that are never released, usually because the plugin died before
+reading them, are unlinked by the core once they expire. Shared memory needs python 3.8, before which large
+results go through the connection like the others.
+"""
+import time
+import array
+from threading import Lock
+try:
+    from multiprocess import resource_tracker
+    from multiprocess.shared_memory import SharedMemory
+except ImportError:  # Before python 3.8, results are then sent through the connection like any other
+    resource_tracker = SharedMemory = None
+
+# Results of at least this many bytes are shared. 0 disables shared memory transfers.
+THRESHOLD = 1024 * 1024
+# Seconds after which an unreleased segment is considered abandoned.
+SEGMENT_TTL = 60
+
+_BUFFER_TYPES = (bytes, bytearray, memoryview, array.array)
+_SEGMENTS = {}
+_SEGMENTS_LOCK = Lock()
+
+
+def share(value):
+    """
+    Copy a large buffer-like value into a new shared memory segment.
+
+    :param object value: the result to share
+
+    :returns: (segment name, size in bytes, type name, array typecode) handle, or None if the value is not
+    worth sharing
+    :rtype: tuple|None
+    """
+    if SharedMemory is None or not THRESHOLD or not isinstance(value, _BUFFER_TYPES):
+        return None
+    view = memoryview(value)
+    if view.nbytes < THRESHOLD or not view.c_contiguous:
+        return None
+    _sweep()
+    segment = SharedMemory(create=True, size=view.nbytes)
+    segment.buf[:view.nbytes] = view.cast("B")
+    # The plugin is responsible for unlinking the segment, so the core must not track it on its own.
+    resource_tracker.unregister(segment._name, "shared_memory")  #pylint: disable=protected-access
+    with _SEGMENTS_LOCK:
+        _SEGMENTS[segment.name] = time.monotonic()
+    segment.close()
+    return (
+        segment.name,
+        view.nbytes,
+        type(value).__name__,
+        value.typecode if isinstance(value, array.array) else None
+    )
+
+
+def _sweep():
+    """
+    Unlink the shared segments that have not been released by their plugin in time.
+    """
+    if SharedMemory is None:
+        return
+    now = time.monotonic()
+    with _SEGMENTS_LOCK:
+        expired = [name for name, created in _SEGMENTS.items() if now - created > SEGMENT_TTL]
+        for name in expired:
+            del _SEGMENTS[name]
+    for name in expired:
+        try:
+            segment = SharedMemory(name=name)
+        except FileNotFoundError:
+            # Released by the plugin
+            continue
+        segment.close()
+        segment.unlink()
+
+
+def cleanup():
+    """
+    Unlink every shared segment that is still around. Called on exit.
+    """
+    with _SEGMENTS_LOCK:
+        for name in _SEGMENTS:
+            _SEGMENTS[name] = float("-inf")
+    _sweep()
@@ -0,0 +1,196 @@
+"""
+Per-skill instrumentation of the RPC calls served by the core, broken down by calling plugin.
+
+Measuring payloads must not cost a second serialization on every call. Requests are measured as received
+when the server reads each call as its own frame. Otherwise only the bytes and strings passed as arguments are
+counted, with len(). Results are measured on what was packed for the plugin.
+"""
+import time
+import bisect
+import itertools
+import threading
+
+from utils.log_utils import LOG  #pylint: disable=no-name-in-module
+
+# Upper bounds of the latency histogram buckets, in milliseconds. The last bucket has no upper bound.
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Number of skills included in the periodic log summary.
+SUMMARY_SIZE = 10
+
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+
+class _SkillStats():
+    """
+    Counters of the calls made by one plugin to one skill.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def percentile(self, fraction):
+        """
+        Estimate a latency percentile from the histogram.
+
+        :param float fraction: the percentile to estimate, between 0 and 1
+
+        :returns: upper bound of the bucket the percentile falls in, in milliseconds
+        :rtype: float
+        """
+        target = fraction * self.calls
+        seen = 0
+        for i, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= target:
+                return BUCKETS_MS[i] if i < len(BUCKETS_MS) else self.max_ms
+        return 0.0
+
+    def dump(self):
+        """
+        :returns: the counters as builtin types
+        :rtype: dict
+        """
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": self.total_ms,
+            "mean_ms": self.total_ms / self.calls if self.calls else 0.0,
+            "max_ms": self.max_ms,
+            "p50_ms": self.percentile(0.5),
+            "p99_ms": self.percentile(0.99),
+            "histogram": dict(zip([str(bound) for bound in BUCKETS_MS] + ["inf"], self.histogram)),
+            "request_bytes": self.request_bytes,
+            "response_bytes": self.response_bytes
+        }
+
+
+def record(skill, caller, elapsed, error=False, request_bytes=0, response_bytes=0):
+    """
+    Record a call made to a skill.
+
+    :param str skill: dotted name of the skill
+    :param str caller: name of the plugin that made the call
+    :param float elapsed: duration of the call in seconds
+    :param bool error: whether the call raised
+    :param int request_bytes: size of the arguments
+    :param int response_bytes: size of the result
+    """
+    elapsed_ms = elapsed * 1000
+    with _STATS_LOCK:
+        stats = _STATS.get((skill, caller))
+        if stats is None:
+            stats = _STATS[(skill, caller)] = _SkillStats()
+        stats.calls += 1
+        stats.errors += error
+        stats.total_ms += elapsed_ms
+        stats.max_ms = max(stats.max_ms, elapsed_ms)
+        stats.histogram[bisect.bisect_left(BUCKETS_MS, elapsed_ms)] += 1
+        stats.request_bytes += request_bytes
+        stats.response_bytes += response_bytes
+
+
+def request_size(args, kwargs, received=None):
+    """
+    Measure the size of the arguments of a call, without serializing them.
+
+    :param tuple args: args of the call
+    :param dict kwargs: kwargs of the call
+    :param int received: size of the request as received by the server, if known
+
+    :returns: size of the request if known, otherwise the size of the bytes and strings among the arguments,
+    in bytes
+    :rtype: int
+    """
+    if received is not None:
+        return received
+    size = 0
+    for value in itertools.chain(args, kwargs.values()):
+        if isinstance(value, (bytes, bytearray, str)):
+            size += len(value)
+        elif isinstance(value, memoryview):
+            size += value.nbytes
+    return size
+
+
+def reply_size(reply):
+    """
+    Measure the size of a packed result.
+
+    :param tuple reply: (kind, payload, ...) as packed for the plugin
+
+    :returns: size of the payload in bytes, 0 if it can't be measured
+    :rtype: int
+    """
+    kind, payload = reply[:2]
+    if kind == "p5":
+        return len(payload)
+    if kind == "shm":
+        return payload[1]
+    if kind == "iter":
+        return reply_size(payload[1])
+    return 0
+
+
+def snapshot():
+    """
+    Fetch the stats of every skill called so far.
+
+    :returns: the stats of each skill by dotted name, then by calling plugin
+    :rtype: dict[str, dict[str, dict]]
+    """
+    with _STATS_LOCK:
+        dumped = {key: stats.dump() for key, stats in _STATS.items()}
+    result = {}
+    for (skill, caller), stats in dumped.items():
+        result.setdefault(skill, {})[caller] = stats
+    return result
+
+
+def log_summary():
+    """
+    Log the skills the core spent the most time in, over all plugins.
+    """
+    totals = []
+    for skill, callers in snapshot().items():
+        calls = sum(stats["calls"] for stats in callers.values())
+        totals.append((
+            sum(stats["total_ms"] for stats in callers.values()),
+            skill,
+            calls,
+            sum(stats["errors"] for stats in callers.values()),
+            max(stats["p99_ms"] for stats in callers.values()),
+            ", ".join(sorted(callers, key=lambda caller: -callers[caller]["calls"]))
+        ))
+    if not totals:
+        return
+    LOG.info(
+        "RPC stats, top %s skills by total time:\n%s",
+        SUMMARY_SIZE,
+        "\n".join(
+            "%s: %s calls, %s errors, %.1fms total, p99 <= %sms (%s)" %
+            (skill, calls, errors, total, p99, callers)
+            for total, skill, calls, errors, p99, callers in sorted(totals, reverse=True)[:SUMMARY_SIZE]
+        )
+    )
+
+
+def log_periodically(interval):
+    """
+    Start a thread logging the stats summary every so often.
+
+    :param float interval: number of seconds between summaries
+    """
+    def _loop():
+        while True:
+            time.sleep(interval)
+            try:
+                log_summary()
+            except Exception:  #pylint: disable=broad-except
+                LOG.exception("Could not log RPC stats.")
+    threading.Thread(target=_loop, daemon=True, name="aigis-rpc-stats").start()
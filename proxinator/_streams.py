@@ -0,0 +1,132 @@
+"""
+Keep track of the iterators returned by skills while plugins consume them chunk by chunk.
+
+Generators can't be serialized, and materializing a large result set before returning it spikes memory in
+the core and delays the first item in the plugin. Instead, the core keeps the iterator and plugins pull
+chunks of items from it until it is exhausted.
+
+A stream is dropped once exhausted, when the plugin closes it, when the connection or plugin that opened it
+goes away, or once it has been left untouched for too long.
+"""
+import time
+import itertools
+import threading
+import contextvars
+
+# Default number of items sent per chunk.
+CHUNK_SIZE = 64
+# Seconds after which a stream that hasn't been read from is considered abandoned.
+STREAM_TTL = 600
+
+_STREAMS = {}
+_STREAMS_LOCK = threading.Lock()
+_IDS = itertools.count()
+# What the streams opened in the current context belong to. Servers handling several connections per thread
+# set it to the connection, otherwise streams belong to the name of the plugin calling.
+OWNER = contextvars.ContextVar("OWNER", default=None)
+
+
+class _Stream():
+    """
+    An iterator being streamed to a plugin.
+
+    :param iterator iterator: the iterator returned by the skill
+    :param object owner: what the stream's lifetime is tied to, the plugin's connection or name
+    """
+    def __init__(self, iterator, owner):
+        self.iterator = iterator
+        self.owner = owner
+        self.touched = time.monotonic()
+        self.error = None
+        self.lock = threading.Lock()
+
+
+def open_stream(iterator):
+    """
+    Register an iterator to be streamed to the plugin calling the current skill.
+
+    :param iterator iterator: the iterator to stream
+
+    :returns: the id of the stream
+    :rtype: int
+    """
+    _sweep()
+    stream_id = next(_IDS)
+    with _STREAMS_LOCK:
+        _STREAMS[stream_id] = _Stream(iterator, OWNER.get())
+    return stream_id
+
+
+def read(stream_id, size=None):
+    """
+    Pull the next chunk of items from a stream. Exhausted streams are dropped.
+    If the iterator raises after some items of the chunk were produced, those items are returned and the
+    error is raised on the next read instead.
+
+    :param int stream_id: id of the stream
+    :param int size: max number of items to read. Defaults to CHUNK_SIZE.
+
+    :returns: the items read and whether the stream is exhausted
+    :rtype: tuple(list, bool)
+
+    :raises KeyError: if the stream does not exist (anymore)
+    :raises Exception: whatever the iterator raised
+    """
+    with _STREAMS_LOCK:
+        stream = _STREAMS[stream_id]
+    with stream.lock:
+        stream.touched = time.monotonic()
+        if stream.error:
+            close(stream_id)
+            raise stream.error
+        chunk = []
+        try:
+            chunk.extend(itertools.islice(stream.iterator, size or CHUNK_SIZE))
+        except Exception as e:  #pylint: disable=broad-except
+            if not chunk:
+                close(stream_id)
+                raise
+            stream.error = e
+            return chunk, False
+    if len(chunk) < (size or CHUNK_SIZE):
+        close(stream_id)
+        return chunk, True
+    return chunk, False
+
+
+def close(stream_id):
+    """
+    Drop a stream, closing its iterator if it is a generator.
+
+    :param int stream_id: id of the stream
+    """
+    with _STREAMS_LOCK:
+        stream = _STREAMS.pop(stream_id, None)
+    if stream and hasattr(stream.iterator, "close"):
+        try:
+            stream.iterator.close()
+        except Exception:  #pylint: disable=broad-except
+            pass
+
+
+def release_owner(owner):
+    """
+    Drop all the streams of a plugin which went away.
+
+    :param object owner: the plugin's connection or name
+    """
+    with _STREAMS_LOCK:
+        released = [stream_id for stream_id, stream in _STREAMS.items() if stream.owner == owner]
+    for stream_id in released:
+        close(stream_id)
+
+
+def _sweep():
+    """
+    Drop the streams that haven't been read from in too long.
+    """
+    now = time.monotonic()
+    with _STREAMS_LOCK:
+        abandoned = [stream_id for stream_id, stream in _STREAMS.items() if now - stream.touched > STREAM_TTL]
+    for stream_id in abandoned:
+        close(stream_id)
@@ -6,7 +6,27 @@ a runtime, but thanks to python sys.modules behavior that can't happen. All code
 runtimes of each plugin, but it is entirely inaccessible.
 """
 import sys
+import hmac
+import time
+import array
+import queue
+import struct
+import pickle
+import socket
+import asyncio
+import itertools
+import contextvars
+from collections import deque
+from argparse import ArgumentParser
+from threading import Thread, Lock
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as _FutureTimeoutError
 from multiprocess.managers import SyncManager
+from multiprocess.reduction import ForkingPickler
+
+# Max number of calls the awaitable proxy can have in flight at once. Each in-flight call holds a connection.
+_ASYNC_MAX_IN_FLIGHT = 32
+# Max number of seconds each wait for invalidations from the core lasts before being renewed.
+_INVALIDATION_POLL = 60
 
 
 class _WrapManager(SyncManager):
@@ -15,15 +35,236 @@ class _WrapManager(SyncManager):
     """
 # Register the pseq processing function
 _WrapManager.register("get_aigis")
-_WMGR = _WrapManager(address=("0.0.0.0", 50000), authkey=b"aigis")
-_WMGR.connect()
-_REMOTE_AIGIS_CORE = _WMGR.get_aigis()
+
+
+def _parse_address(address):
+    """
+    Parse the address of the RPC server received from AIGIS.
+
+    :param str address: "host:port" for TCP or a file path for a unix domain socket
+
+    :returns: the address as expected by the manager
+    :rtype: tuple|str
+    """
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host, int(port))
+    return address
+
+
+class _AIGISConnection():
+    """
+    Multiplexed connection to the core's event loop server. Requests are tagged with an id and sent over the
+    single connection from any thread, while a reader thread hands the replies to whoever is waiting on them,
+    in whatever order they come back. Endpoints are called like methods, same as on the manager proxy.
+
+    :param tuple|str address: (host, port) for TCP or a file path for a unix domain socket
+    :param bytes authkey: key proving the plugin is allowed to connect
+    :param str name: name of the plugin
+    """
+    _HEADER = struct.Struct(">I")
+
+    def __init__(self, address, authkey, name):
+        tcp = isinstance(address, tuple)
+        self._socket = socket.socket(socket.AF_INET if tcp else socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(address)
+        if tcp:
+            self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        nonce = self._recv_frame()
+        self._send_frame(hmac.new(authkey, nonce, "sha256").digest() + name.encode())
+        if self._recv_frame() != b"OK":
+            raise ConnectionRefusedError("AIGIS core refused the connection.")
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = Lock()
+        self._lost = None
+        Thread(target=self._read_replies, daemon=True).start()
+
+    def submit(self, endpoint, *args, **kwargs):
+        """
+        Send a request without waiting for its reply.
+
+        :param str endpoint: name of the endpoint to call
+        :param args: args to pass to the endpoint
+        :param kwargs: kwargs to pass to the endpoint
+
+        :returns: future resolving to the reply of the endpoint
+        :rtype: concurrent.futures.Future
+
+        :raises ConnectionError: if the connection to the core was lost
+        """
+        future = Future()
+        request_id = next(self._ids)
+        data = ForkingPickler.dumps((request_id, endpoint, args, kwargs))
+        with self._lock:
+            if self._lost:
+                raise self._lost
+            self._pending[request_id] = future
+            self._send_frame(data)
+        return future
+
+    def __getattr__(self, endpoint):
+        """
+        :param str endpoint: name of the endpoint to call
+
+        :returns: function calling the endpoint and waiting for its reply
+        :rtype: callable
+        """
+        if endpoint.startswith("_"):
+            raise AttributeError(endpoint)
+        return lambda *args, **kwargs: self.submit(endpoint, *args, **kwargs).result()
+
+    def _read_replies(self):
+        """
+        Hand the replies received to the futures waiting on them, until the connection is lost.
+        """
+        try:
+            while True:
+                request_id, success, value = ForkingPickler.loads(self._recv_frame())
+                future = self._pending.pop(request_id, None)
+                if future is None:
+                    continue
+                if success:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+        except Exception as e:  #pylint: disable=broad-except
+            with self._lock:
+                self._lost = ConnectionError("Lost the connection to the AIGIS core: %r" % e)
+                pending, self._pending = self._pending, {}
+            for future in pending.values():
+                future.set_exception(self._lost)
+
+    def _send_frame(self, data):
+        """
+        :param bytes data: payload of the frame to send
+        """
+        self._socket.sendall(self._HEADER.pack(len(data)) + data)
+
+    def _recv_frame(self):
+        """
+        :returns: the payload of the next frame received
+        :rtype: bytearray
+
+        :raises EOFError: if the connection closes
+        """
+        size, = self._HEADER.unpack(self._recv_exactly(self._HEADER.size))
+        return self._recv_exactly(size)
+
+    def _recv_exactly(self, size):
+        """
+        :param int size: number of bytes to read
+
+        :returns: the bytes read
+        :rtype: bytearray
+
+        :raises EOFError: if the connection closes
+        """
+        data = bytearray(size)
+        view = memoryview(data)
+        read = 0
+        while read < size:
+            received = self._socket.recv_into(view[read:])
+            if not received:
+                raise EOFError("Connection closed by the AIGIS core.")
+            read += received
+        return data
+
+
+PARSER = ArgumentParser()
+PARSER.add_argument("--ENTRYPOINT", dest="ENTRYPOINT")
+PARSER.add_argument("--LAUNCH", dest="LAUNCH")
+PARSER.add_argument("--ADDRESS", dest="ADDRESS", default="0.0.0.0:50000")
+PARSER.add_argument("--NAME", dest="NAME", default="unknown")
+PARSER.add_argument("--SERVER", dest="SERVER", default="manager")
+PARSER.add_argument("--TIMEOUT", dest="TIMEOUT", type=float, default=0)
+ARGS = PARSER.parse_args()
+
+# Whether the core multiplexes calls over a single connection, in which case calls don't need a thread each.
+_MULTIPLEXED = ARGS.SERVER == "asyncio"
+if _MULTIPLEXED:
+    _REMOTE_AIGIS_CORE = _AIGISConnection(_parse_address(ARGS.ADDRESS), b"aigis", ARGS.NAME)
+else:
+    _WMGR = _WrapManager(address=_parse_address(ARGS.ADDRESS), authkey=b"aigis")
+    _WMGR.connect()
+    _REMOTE_AIGIS_CORE = _WMGR.get_aigis(ARGS.NAME)
+
+# Constants read from the core, by dotted name, as the reply received. Only constants encoded with the stdlib
+# pickle are kept, since they are decoded again on every read and can't be mutated by the plugin.
+_CONSTANTS = {}
+_CONSTANTS_LOCK = Lock()
+# Last skill generation of the core the constants have been invalidated for.
+_GENERATION = -1
+# Whether constants can be cached. Turned off if invalidations can't be received anymore.
+_CACHE_CONSTANTS = True
+
+# Max number of seconds any call to the core may take, unless a shorter deadline is set. None for no limit.
+_DEFAULT_TIMEOUT = ARGS.TIMEOUT or None
+# Deadline of the calls made in the current context, as set by AIGISDeadline, in time.monotonic() seconds.
+_DEADLINE = contextvars.ContextVar("_DEADLINE", default=None)
+# Errors raised when waiting for a future times out, which are distinct classes before python 3.11.
+_TIMEOUT_ERRORS = (TimeoutError, _FutureTimeoutError, asyncio.TimeoutError)
+
+
+class AIGISTimeoutError(TimeoutError):
+    """
+    Raised when a call to the core does not complete before its deadline.
+    """
+
+
+class _AIGISDeadline():
+    """
+    Context manager bounding how long the calls to the core made inside it may take, in total. Deadlines can
+    be nested, in which case the earliest one applies. Calls running past the deadline raise
+    AIGISTimeoutError, and the core abandons them if they haven't started yet.
+
+    with aigis.AIGISDeadline(2):
+        user = aigis.my_database.get_user(name)
+        groups = aigis.my_database.get_groups(user)
+
+    :param float seconds: number of seconds the calls may take
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self._tokens = []
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.seconds
+        current = _DEADLINE.get()
+        self._tokens.append(_DEADLINE.set(deadline if current is None else min(current, deadline)))
+        return self
+
+    def __exit__(self, *exc):
+        _DEADLINE.reset(self._tokens.pop())
+
+
+def _timeout():
+    """
+    :returns: number of seconds the call about to be made may take, None if it can take forever
+    :rtype: float|None
+    """
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return _DEFAULT_TIMEOUT
+    left = deadline - time.monotonic()
+    return left if _DEFAULT_TIMEOUT is None else min(left, _DEFAULT_TIMEOUT)
+
+
+def _expired(what):
+    """
+    :param str what: description of the call
+
+    :returns: the error raised by a call running past its deadline
+    :rtype: AIGISTimeoutError
+    """
+    return AIGISTimeoutError("%s did not complete before its deadline." % what)
 
 
 def _inject(pseq, *args, **kwargs):
     """
     Underlying RPC logic powering the transfer. Connect to the RPC port and fetch the remote processor proxy,
     then pass it the pseq. It will return the result of the pseq processing.
+    Constants are served from the local cache when possible.
 
     :param list pseq: the point sequence to call
     :param args: the args to pass to the pseq
@@ -31,8 +272,460 @@ def _inject(pseq, *args, **kwargs):
 
     :returns: whatever the remote processing of the pseq returns, if it is a valid type
     :rtype: object
+
+    :raises AIGISTimeoutError: if the call does not complete before its deadline
+    """
+    name = None
+    if not args and not kwargs:
+        name = ".".join(pseq)
+        reply = _CONSTANTS.get(name)
+        if reply is not None:
+            return _unpack(reply)
+    reply = _call_core("parse_pseq", "Call to %s" % ".".join(pseq), pseq, *args, **kwargs)
+    if name is not None:
+        _remember_constant(name, reply)
+    return _unpack(reply)
+
+
+def _remember_constant(name, reply):
+    """
+    Cache the reply of the core if it holds a constant that can be cached.
+
+    :param str name: dotted name of the value
+    :param tuple reply: (kind, payload, generation) as packed by the server
+    """
+    kind, _, generation = reply
+    if generation is None or kind != "p5":
+        return
+    with _CONSTANTS_LOCK:
+        # A reply older than the last invalidation may already be stale
+        if _CACHE_CONSTANTS and generation >= _GENERATION:
+            _CONSTANTS[name] = reply
+
+
+def _listen_skill_changes():
+    """
+    Wait for the core's skills to change, then drop the cached constants affected and refresh the skill
+    manifest, forever. Runs in its own thread, and thus its own connection to the core.
+    """
+    global _GENERATION, _CACHE_CONSTANTS, _STUBS  #pylint: disable=global-statement
+    try:
+        while True:
+            generation, names = _REMOTE_AIGIS_CORE.wait_invalidation(_GENERATION, _INVALIDATION_POLL)
+            with _CONSTANTS_LOCK:
+                if generation == _GENERATION:
+                    continue
+                _GENERATION = generation
+                if names is None:
+                    _CONSTANTS.clear()
+                else:
+                    for name in [name for name in _CONSTANTS if name.split(".", 1)[0] in names]:
+                        del _CONSTANTS[name]
+            _load_manifest()
+    except Exception:  #pylint: disable=broad-except
+        # Without invalidations, cached constants and the manifest could go stale without anyone knowing
+        with _CONSTANTS_LOCK:
+            _CACHE_CONSTANTS = False
+            _CONSTANTS.clear()
+        _STUBS = None
+
+
+def _unpack(reply):
+    """
+    Regenerate the result of a call from what was sent over by the server.
+
+    :param tuple reply: (kind, payload, generation) as packed by the server
+
+    :returns: the result of the call
+    :rtype: object
+    """
+    kind, payload = reply[:2]
+    if kind == "obj":
+        return payload
+    return _DECODERS[kind](payload)
+
+
+def _read_shared(name, nbytes, rtype, typecode):
+    """
+    Copy a buffer result out of the shared memory segment the server put it in, then release the segment.
+
+    :param str name: name of the shared memory segment
+    :param int nbytes: size of the result in bytes
+    :param str rtype: name of the type of the result
+    :param str typecode: typecode of the result if it is an array
+
+    :returns: the result, of the same type it was on the server. Memoryviews are returned as views on a
+    bytearray.
+    :rtype: bytes|bytearray|memoryview|array.array
+    """
+    # Only imported when needed, segments are only sent by cores running python 3.8 or later
+    from multiprocess.shared_memory import SharedMemory
+    segment = SharedMemory(name=name)
+    try:
+        data = segment.buf[:nbytes]
+        try:
+            if rtype == "bytes":
+                return bytes(data)
+            if rtype == "array":
+                return array.array(typecode, data)
+            if rtype == "memoryview":
+                return memoryview(bytearray(data))
+            return bytearray(data)
+        finally:
+            data.release()
+    finally:
+        segment.close()
+        segment.unlink()
+
+
+# Streams and references to release in the core, as (endpoint, id), sent by the release thread.
+_RELEASES = queue.SimpleQueue()
+
+
+def _release(endpoint, resource_id):
+    """
+    Have the release thread release a stream or reference in the core. Safe to call from finalizers, which can
+    run on any thread at any point, including while a call to the core is being sent or its reply read.
+
+    :param str endpoint: "close_stream" or "ref_release"
+    :param int resource_id: id of the stream or reference
+    """
+    _RELEASES.put((endpoint, resource_id))
+
+
+def _send_releases():
+    """
+    Send the releases queued by finalizers, forever. Runs in its own thread, and thus its own connection to
+    the core. Replies aren't waited on over a multiplexed connection, and failures are ignored since the core
+    releases whatever the plugin leaves behind once it's gone anyway.
+    """
+    while True:
+        endpoint, resource_id = _RELEASES.get()
+        try:
+            if _MULTIPLEXED:
+                _REMOTE_AIGIS_CORE.submit(endpoint, resource_id)
+            else:
+                getattr(_REMOTE_AIGIS_CORE, endpoint)(resource_id)
+        except Exception:  #pylint: disable=broad-except
+            pass
+
+
+class _AIGISRemoteIterator():
+    """
+    Iterator over the items of an iterator returned by a skill, which stays in the core. Items are pulled
+    from the core in chunks as they are consumed. The size of the chunks can be changed by setting
+    chunk_size, otherwise the core's default is used.
+    Can also be iterated over asynchronously, in which case chunks are fetched without blocking the event
+    loop.
+
+    :param int stream_id: id of the stream in the core
+    :param tuple chunk: the packed first chunk of items
+    :param bool done: whether the iterator is already exhausted
+    """
+    def __init__(self, stream_id, chunk, done):
+        self.chunk_size = None
+        self._stream_id = stream_id
+        self._items = deque(_unpack(chunk))
+        self._done = done
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        while not self._items:
+            if self._done:
+                raise StopIteration
+            self._fetch()
+        return self._items.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._items:
+            if self._done:
+                raise StopAsyncIteration
+            # Run in the current context, for the deadline to apply
+            await asyncio.get_running_loop().run_in_executor(
+                _async_executor(), contextvars.copy_context().run, self._fetch
+            )
+        return self._items.popleft()
+
+    def _fetch(self):
+        """
+        Pull the next chunk of items from the core.
+
+        :raises AIGISTimeoutError: if the chunk is not received before the deadline
+        """
+        try:
+            reply = _call_core("next_chunk", "Reading the next items of an iterator", self._stream_id, self.chunk_size)
+        except AIGISTimeoutError:
+            # Items may have been read for nobody, so the stream can't be resumed
+            self._done = True
+            _release("close_stream", self._stream_id)
+            raise
+        except Exception:
+            # The core drops the stream when its iterator raises
+            self._done = True
+            raise
+        self._done = reply[2]
+        self._items.extend(_unpack(reply))
+
+    def close(self):
+        """
+        Stop iterating, releasing the iterator in the core.
+        """
+        self._items.clear()
+        if not self._done:
+            self._done = True
+            _REMOTE_AIGIS_CORE.close_stream(self._stream_id)
+
+    def __del__(self):
+        if not getattr(self, "_done", True):
+            self._done = True
+            _release("close_stream", self._stream_id)
+
+
+class _AIGISRemoteObject():
+    """
+    Handle to an object returned by reference by a skill, which stays in the core. Reading an attribute or
+    calling a method of the handle forwards it to the object. The core releases the object once every handle
+    to it has been dropped.
+
+    :param int ref_id: id of the reference in the core
+    :param str rtype: name of the type of the object
+    :param list[str] methods: methods of the object which can be called through the handle
+    """
+    def __init__(self, ref_id, rtype, methods):
+        object.__setattr__(self, "_AIGISref", ref_id)
+        object.__setattr__(self, "_AIGIStype", rtype)
+        object.__setattr__(self, "_AIGISmethods", frozenset(methods))
+
+    def __getattr__(self, attr):
+        """
+        Only called for names that aren't attributes of the handle itself.
+
+        :param str attr: the attribute requested
+
+        :returns: a function forwarding calls if the attribute is a method, the value of the attribute in
+        the core otherwise
+        :rtype: object
+        """
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr in self._AIGISmethods:
+            return lambda *args, **kwargs: self._AIGIScall(attr, *args, **kwargs)
+        return _unpack(_call_core(
+            "ref_getattr", "Reading %s of a %s object" % (attr, self._AIGIStype), self._AIGISref, attr
+        ))
+
+    def __setattr__(self, attr, value):
+        raise AttributeError("Attributes of objects held by the AIGIS core can't be set through a handle.")
+
+    def _AIGIScall(self, method, *args, **kwargs):
+        """
+        Call a method of the object in the core.
+
+        :param str method: name of the method
+        :param args: args to pass to the method
+        :param kwargs: kwargs to pass to the method
+
+        :returns: the return of the method
+        :rtype: object
+
+        :raises TypeError: if the object has no such method
+        :raises AIGISTimeoutError: if the call does not complete before its deadline
+        """
+        if method not in self._AIGISmethods:
+            raise TypeError("%s object held by the AIGIS core does not support %s" % (self._AIGIStype, method))
+        return _unpack(_call_core(
+            "ref_call", "Call to %s of a %s object" % (method, self._AIGIStype), self._AIGISref, method, *args, **kwargs
+        ))
+
+    def __call__(self, *args, **kwargs):
+        return self._AIGIScall("__call__", *args, **kwargs)
+
+    def __len__(self):
+        return self._AIGIScall("__len__")
+
+    def __bool__(self):
+        return "__len__" not in self._AIGISmethods or bool(len(self))
+
+    def __getitem__(self, key):
+        return self._AIGIScall("__getitem__", key)
+
+    def __iter__(self):
+        return iter(self._AIGIScall("__iter__"))
+
+    def __contains__(self, item):
+        return self._AIGIScall("__contains__", item)
+
+    def __repr__(self):
+        return "<aigis handle to %s object>" % self._AIGIStype
+
+    def __del__(self):
+        _release("ref_release", self._AIGISref)
+
+
+def _inject_batch(calls):
+    """
+    Send several point sequences to the RPC server in a single round trip.
+
+    :param list[tuple] calls: (pseq, args, kwargs) of each call to make
+
+    :returns: (success, result or raised exception) of each call, in order
+    :rtype: list[tuple]
+    """
+    return [
+        (success, _unpack(value) if success else value)
+        for success, value in _call_core("parse_batch", "Batch of %s calls" % len(calls), calls)
+    ]
+
+
+def _call_core(endpoint, what, *args, **kwargs):
+    """
+    Call an endpoint of the core, within the deadline of the current context if there is one.
+
+    :param str endpoint: name of the endpoint, which must have an _until variant taking a timeout first
+    :param str what: description of the call, for the timeout error
+    :param args: args of the endpoint
+    :param kwargs: kwargs of the endpoint
+
+    :returns: the reply of the endpoint
+    :rtype: object
+
+    :raises AIGISTimeoutError: if the call does not complete before its deadline
     """
-    return _REMOTE_AIGIS_CORE.parse_pseq(pseq, *args, **kwargs)
+    timeout = _timeout()
+    if timeout is None:
+        return getattr(_REMOTE_AIGIS_CORE, endpoint)(*args, **kwargs)
+    if timeout <= 0:
+        raise _expired(what)
+    # The call is made from another thread so this one can give up on it, leaving it to complete unheard
+    if _MULTIPLEXED:
+        future = _REMOTE_AIGIS_CORE.submit(endpoint + "_until", timeout, *args, **kwargs)
+    else:
+        future = _deadline_executor().submit(_send_until, endpoint, time.monotonic() + timeout, *args, **kwargs)
+    try:
+        return future.result(timeout)
+    except _TIMEOUT_ERRORS as e:
+        raise _expired(what) from e
+
+
+def _send_until(endpoint, deadline, *args, **kwargs):
+    """
+    Call the _until variant of an endpoint through the manager, from a deadline worker. The timeout sent is
+    only computed once the call leaves, so that time spent waiting for a free worker counts against it.
+
+    :param str endpoint: name of the endpoint
+    :param float deadline: time.monotonic() after which the plugin stops waiting
+    :param args: args of the endpoint
+    :param kwargs: kwargs of the endpoint
+
+    :returns: the reply of the endpoint
+    :rtype: object
+
+    :raises TimeoutError: if the deadline passed before the call could be sent
+    """
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("The deadline passed before the call could be sent.")
+    return getattr(_REMOTE_AIGIS_CORE, endpoint + "_until")(left, *args, **kwargs)
+
+
+_ASYNC_EXECUTOR = None
+def _async_executor():
+    """
+    Fetch the worker threads used to send RPC calls without blocking event loops. The manager proxy keeps one
+    connection per thread, so each worker has its own connection to the core and calls can be in flight
+    concurrently.
+
+    :returns: the executor, created on first use
+    :rtype: ThreadPoolExecutor
+    """
+    global _ASYNC_EXECUTOR  #pylint: disable=global-statement
+    if _ASYNC_EXECUTOR is None:
+        _ASYNC_EXECUTOR = ThreadPoolExecutor(_ASYNC_MAX_IN_FLIGHT, thread_name_prefix="aigis-async")
+    return _ASYNC_EXECUTOR
+
+
+_DEADLINE_EXECUTOR = None
+def _deadline_executor():
+    """
+    Fetch the worker threads used to make calls with a deadline through the manager, whose connections can
+    only be waited on until the reply comes.
+
+    :returns: the executor, created on first use
+    :rtype: ThreadPoolExecutor
+    """
+    global _DEADLINE_EXECUTOR  #pylint: disable=global-statement
+    if _DEADLINE_EXECUTOR is None:
+        _DEADLINE_EXECUTOR = ThreadPoolExecutor(_ASYNC_MAX_IN_FLIGHT, thread_name_prefix="aigis-deadline")
+    return _DEADLINE_EXECUTOR
+
+
+def _inject_async(pseq, *args, **kwargs):
+    """
+    Schedule the RPC call so the calling event loop never blocks. Calls are sent straight away over a
+    multiplexed connection, otherwise they are made from the async worker threads.
+
+    :param list pseq: the point sequence to call
+    :param args: the args to pass to the pseq
+    :param kwargs: the kwargs to pass to the pseq
+
+    :returns: future resolving to whatever the remote processing of the pseq returns
+    :rtype: asyncio.Future
+    """
+    if _MULTIPLEXED:
+        return asyncio.ensure_future(_inject_multiplexed(pseq, args, kwargs))
+    # Run in the current context, for the deadline to apply
+    return asyncio.wrap_future(
+        _async_executor().submit(contextvars.copy_context().run, _inject, pseq, *args, **kwargs)
+    )
+
+
+async def _inject_multiplexed(pseq, args, kwargs):
+    """
+    Awaitable version of _inject, over the multiplexed connection.
+
+    :param list pseq: the point sequence to call
+    :param tuple args: the args to pass to the pseq
+    :param dict kwargs: the kwargs to pass to the pseq
+
+    :returns: whatever the remote processing of the pseq returns
+    :rtype: object
+
+    :raises AIGISTimeoutError: if the call does not complete before its deadline
+    """
+    name = None
+    if not args and not kwargs:
+        name = ".".join(pseq)
+        reply = _CONSTANTS.get(name)
+        if reply is not None:
+            return _unpack(reply)
+    timeout = _timeout()
+    if timeout is None:
+        reply = await asyncio.wrap_future(_REMOTE_AIGIS_CORE.submit("parse_pseq", pseq, *args, **kwargs))
+    else:
+        if timeout <= 0:
+            raise _expired("Call to %s" % ".".join(pseq))
+        future = _REMOTE_AIGIS_CORE.submit("parse_pseq_until", timeout, pseq, *args, **kwargs)
+        try:
+            reply = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except _TIMEOUT_ERRORS as e:
+            raise _expired("Call to %s" % ".".join(pseq)) from e
+    if name is not None:
+        _remember_constant(name, reply)
+    return _unpack(reply)
+
+# Decoders matching the encoders of the server, by kind
+_DECODERS = {
+    "ref": lambda ref: _AIGISRemoteObject(*ref),
+    "iter": lambda stream: _AIGISRemoteIterator(*stream),
+    "shm": lambda handle: _read_shared(*handle),
+    "p5": pickle.loads
+}
+
 
 class _AIGISCopyCat():
     """
@@ -71,34 +764,288 @@ class _AIGISCopyCat():
         return self
 
 
+class _AIGISStub():
+    """
+    Precompiled proxy for a namespace or skill listed in the core's manifest. Stubs of the next level are set
+    as plain attributes, so following a known pseq is only attribute lookups, and calling a stub sends its
+    pseq as is.
+    Only names registered in the core can be followed from a namespace, so typos fail without asking the
+    core. Anything can be followed from a skill however, since a skill can be a whole module.
+
+    :param list[str] pseq: the point sequence of the stub
+    """
+    def __init__(self, pseq):
+        self._AIGISpseq = pseq
+        self._AIGISskill = False
+        self._AIGIScallable = False
+        self._AIGISsignature = None
+
+    def __call__(self, *args, **kwargs):
+        """
+        Run the injection with the stub's pseq.
+
+        :param args: args to pass to the server
+        :param kwargs: kwargs to pass to the server
+
+        :returns: the return of the injected call from the server
+        :rtype: object
+        """
+        return _inject(self._AIGISpseq, *args, **kwargs)
+
+    def __getattr__(self, attr):
+        """
+        Only called for names that aren't in the manifest.
+
+        :param str attr: the attribute requested
+
+        :returns: a copycat continuing the pseq, if the stub is a skill
+        :rtype: _AIGISCopyCat
+
+        :raises AttributeError: if the stub is a namespace, since the name isn't registered in the core
+        """
+        if attr.startswith("__") or not self._AIGISskill:
+            raise AttributeError(
+                "No skill %s registered in the AIGIS core." % ".".join(self._AIGISpseq + [attr])
+            )
+        copycat = _AIGISCopyCat()
+        copycat.pseq = self._AIGISpseq + [attr]
+        return copycat
+
+    def __repr__(self):
+        if self._AIGIScallable:
+            return "<aigis skill %s%s>" % (".".join(self._AIGISpseq), self._AIGISsignature or "(...)")
+        return "<aigis %s %s>" % ("constant" if self._AIGISskill else "namespace", ".".join(self._AIGISpseq))
+
+
+def _load_manifest():
+    """
+    Fetch the manifest of the skills registered in the core and rebuild the stubs from it.
+    """
+    global _STUBS  #pylint: disable=global-statement
+    _, manifest = _REMOTE_AIGIS_CORE.manifest()
+    stubs = {}
+    for name, (is_callable, signature) in manifest.items():
+        pseq = name.split(".")
+        stub = stubs.get(pseq[0])
+        if stub is None:
+            stub = stubs[pseq[0]] = _AIGISStub(pseq[:1])
+        for i in range(1, len(pseq)):
+            child = stub.__dict__.get(pseq[i])
+            if child is None:
+                child = _AIGISStub(pseq[:i+1])
+                setattr(stub, pseq[i], child)
+            stub = child
+        stub._AIGISskill = True
+        stub._AIGIScallable = is_callable
+        stub._AIGISsignature = signature
+    _STUBS = stubs
+
+
+class _AIGISBatchCopyCat(_AIGISCopyCat):
+    """
+    Copycat that queues its call in a batch instead of sending it right away.
+
+    :param _AIGISBatch batch: the batch to queue the call in
+    """
+    def __init__(self, batch):
+        super().__init__()
+        self.batch = batch
+
+    def __call__(self, *args, **kwargs):
+        """
+        Queue the call with the current pseq in the batch.
+
+        :param args: args to pass to the server
+        :param kwargs: kwargs to pass to the server
+
+        :returns: the placeholder that will hold the result once the batch is sent
+        :rtype: _AIGISBatchResult
+        """
+        return self.batch._queue(self.pseq, args, kwargs)
+
+    def __getattr__(self, attr):
+        """
+        Same as the _AIGISCopyCat, but the batch attribute must not be mistaken for a pseq.
+
+        :param str attr: the attribute requested
+
+        :returns: self, the current copycat object
+        :rtype: _AIGISBatchCopyCat
+        """
+        if attr == "batch":
+            raise AttributeError(attr)
+        return super().__getattr__(attr)
+
+
+class _AIGISAsyncCopyCat(_AIGISCopyCat):
+    """
+    Copycat whose calls return awaitables instead of blocking until the server responds.
+    """
+    def __call__(self, *args, **kwargs):
+        """
+        Send the RPC call with the current pseq without blocking the running event loop.
+
+        :param args: args to pass to the server
+        :param kwargs: kwargs to pass to the server
+
+        :returns: future resolving to the return of the injected call from the server
+        :rtype: asyncio.Future
+        """
+        return _inject_async(self.pseq, *args, **kwargs)
+
+
+class _AIGISAsyncProxy():
+    """
+    Awaitable counterpart of _AIGISProxy, for plugins running their own asyncio event loop.
+
+    aigis_async = aigis.AIGISAsync
+    result = await aigis_async.my_database.count()
+    """
+    def __getattr__(self, attr):
+        """
+        Generate a copy of _AIGISAsyncCopyCat to be used to generate this call's pseq.
+
+        :param str attr: starting point's seq
+
+        :returns: the _AIGISAsyncCopyCat object at the correct pseq for further processing
+        :rtype: _AIGISAsyncCopyCat
+        """
+        return _AIGISAsyncCopyCat().__getattr__(attr)
+
+
+class _AIGISBatchResult():
+    """
+    Placeholder for the result of a batched call. Only holds a value once the batch has been sent.
+    """
+    _UNSENT = object()
+    def __init__(self):
+        self._success = False
+        self._value = self._UNSENT
+
+    def result(self):
+        """
+        Fetch the result of the batched call.
+
+        :returns: the return of the injected call from the server
+        :rtype: object
+
+        :raises RuntimeError: if the batch has not been sent yet
+        :raises Exception: whatever the call raised on the server
+        """
+        if self._value is self._UNSENT:
+            raise RuntimeError("Batch has not been executed yet.")
+        if not self._success:
+            raise self._value
+        return self._value
+
+
+class _AIGISBatch():
+    """
+    Group several calls to the core into a single RPC round trip. Calls made on the batch use the same
+    syntax as calls made on aigis, but return a placeholder whose result is available once the batch is
+    executed, either explicitely or when exiting the context manager.
+
+    with aigis.AIGISBatch() as batch:
+        total = batch.my_database.count()
+        name = batch.my_database.MAX_NAME_LENGTH()
+    total.result()
+
+    Exceptions are kept per call and only raised when the failed call's result is requested.
+    """
+    def __init__(self):
+        self._calls = []
+        self._results = []
+
+    def __getattr__(self, attr):
+        """
+        Start a new queued call's pseq.
+
+        :param str attr: starting point's seq
+
+        :returns: the _AIGISBatchCopyCat object at the correct pseq for further processing
+        :rtype: _AIGISBatchCopyCat
+        """
+        return _AIGISBatchCopyCat(self).__getattr__(attr)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.execute()
+
+    def _queue(self, pseq, args, kwargs):
+        """
+        Queue a call to be sent on the next execution.
+
+        :param list pseq: the point sequence to call
+        :param tuple args: the args to pass to the pseq
+        :param dict kwargs: the kwargs to pass to the pseq
+
+        :returns: the placeholder for the call's result
+        :rtype: _AIGISBatchResult
+        """
+        self._calls.append((pseq, args, kwargs))
+        self._results.append(_AIGISBatchResult())
+        return self._results[-1]
+
+    def execute(self):
+        """
+        Send all the queued calls to the core at once. The batch is emptied and can be reused afterwards.
+
+        :returns: the placeholders of every call sent, in the order they were queued
+        :rtype: list[_AIGISBatchResult]
+        """
+        calls, results = self._calls, self._results
+        self._calls, self._results = [], []
+        if not calls:
+            return results
+        for placeholder, (success, value) in zip(results, _inject_batch(calls)):
+            placeholder._success = success
+            placeholder._value = value
+        return results
+
+
 class _AIGISProxy():
     """
     Wrapper class around the _AIGISCopyCat namespace to ensure that each call's pseqs don't get mixed up.
     """
+    AIGISBatch = _AIGISBatch
+    AIGISAsync = _AIGISAsyncProxy()
+    AIGISDeadline = _AIGISDeadline
+    AIGISTimeoutError = AIGISTimeoutError
+
     def __getattr__(self, attr):
         """
-        Override of getattr to generate a copy of _AIGISCopyCat to be used to generate this call's pseq.
+        Override of getattr to fetch the stub of the requested skill. If the manifest can't be trusted,
+        generate a copy of _AIGISCopyCat to be used to generate this call's pseq instead.
 
         :param str attr: starting point's seq
 
-        :returns: the _AIGISCopyCat object at the correct pseq for further processing
-        :rtype: _AIGISCopyCat
+        :returns: the stub or the _AIGISCopyCat object at the correct pseq for further processing
+        :rtype: _AIGISStub|_AIGISCopyCat
+
+        :raises AttributeError: if the manifest does not contain the requested name
         """
-        return _AIGISCopyCat().__getattr__(attr)
+        stubs = _STUBS
+        if stubs is None:
+            return _AIGISCopyCat().__getattr__(attr)
+        try:
+            return stubs[attr]
+        except KeyError:
+            raise AttributeError("No skill %s registered in the AIGIS core." % attr) from None
+
 
+# Stubs of the skills in the core's manifest, by top level name. None if the manifest can't be trusted.
+_STUBS = None
+_load_manifest()
+Thread(target=_listen_skill_changes, daemon=True, name="aigis-skill-changes").start()
+Thread(target=_send_releases, daemon=True, name="aigis-releases").start()
 
 # Syntaxical sugar that lets the proxy be called using a nice name that's consistent accross the AIGIS system
 sys.modules["aigis"] = _AIGISProxy()
 
 ### From here on is logic related to launching the plugin from the arguments received from AIGIS.
-#pylint: disable=wrong-import-position,wrong-import-order
-from argparse import ArgumentParser
-
-PARSER = ArgumentParser()
-PARSER.add_argument("--ENTRYPOINT", dest="ENTRYPOINT")
-PARSER.add_argument("--LAUNCH", dest="LAUNCH")
-ARGS = PARSER.parse_args()
-
 sys.path.append(ARGS.ENTRYPOINT)
 LCHR = __import__(ARGS.LAUNCH)
 LCHR.launch()
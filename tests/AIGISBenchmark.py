@@ -0,0 +1,339 @@
+"""
+Benchmark of the RPC round trips between internal plugins and the core.
+
+Boots a minimal AIGIS with a stand-in core plugin and an internal plugin running the measurements, both loaded
+from local paths so no network is needed. The internal plugin goes through the same injector as any other
+and reports the latency percentiles and throughput of each scenario, which are printed as JSON so runs can be
+compared between commits.
+
+python3 tests/AIGISBenchmark.py -o before.json
+python3 tests/AIGISBenchmark.py -o after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import platform
+import subprocess
+import statistics
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+
+AIGIS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CORE_PLUGIN = "aigisbenchcore"
+CLIENT_PLUGIN = "aigisbenchclient"
+# Env variables used to hand the parameters and results between the benchmark and its internal plugin.
+PARAMS_ENV = "AIGIS_BENCH_PARAMS"
+RESULTS_ENV = "AIGIS_BENCH_RESULTS"
+
+_CORE_CONFIG = """
+PLUGIN_TYPE = "core"
+ENTRYPOINT = "{root}"
+"""
+
+_CORE_SKILLS = '''
+class Payload():
+    """Non builtin result, which needs dill."""
+    def __init__(self, value):
+        self.value = value
+
+class bench():
+    CONSTANT = {"name": "aigis", "limits": list(range(16))}
+    @staticmethod
+    def noop():
+        return None
+    @staticmethod
+    def echo(value):
+        return value
+    @staticmethod
+    def payload(size):
+        return b"x" * size
+    @staticmethod
+    def structure(size):
+        return {str(i): [i, float(i), "item"] for i in range(size)}
+    @staticmethod
+    def custom(size):
+        return Payload(list(range(size)))
+    @staticmethod
+    def sleep(seconds):
+        import time
+        time.sleep(seconds)
+
+SKILLS = ["bench.CONSTANT", "bench.noop", "bench.echo", "bench.payload", "bench.structure", "bench.custom",
+          "bench.sleep"]
+'''
+
+_CLIENT_CONFIG = """
+PLUGIN_TYPE = "internal"
+ENTRYPOINT = "{root}"
+LAUNCH = "main"
+"""
+
+_CLIENT_MAIN = '''
+import sys
+sys.path.insert(0, %r)
+import AIGISBenchmark
+
+def launch():
+    AIGISBenchmark.run_client()
+'''
+
+
+class _Custom():
+    """Non builtin argument, which needs dill."""
+    def __init__(self, value):
+        self.value = value
+
+
+def _measure(name, call, calls, concurrency=1, **info):
+    """
+    Time a call repeatedly, spread over a number of threads.
+
+    :param str name: name of the scenario
+    :param callable call: the call to time
+    :param int calls: total number of calls to make
+    :param int concurrency: number of threads making calls at the same time
+    :param info: extra info on the scenario to include in the results
+
+    :returns: latency percentiles in milliseconds and throughput of the scenario
+    :rtype: dict
+    """
+    call()  # Warm up, also fills any cache the scenario relies on
+    per_thread = max(1, calls // concurrency)
+    def _run():
+        latencies = []
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            call()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = sorted(sum(pool.map(lambda _: _run(), range(concurrency)), []))
+    wall = time.perf_counter() - start
+    result = {
+        "name": name,
+        "calls": len(latencies),
+        "concurrency": concurrency,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": latencies[int(len(latencies) * 0.5)] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "calls_per_sec": len(latencies) / wall
+    }
+    result.update(info)
+    return result
+
+
+def run_client():
+    """
+    Entrypoint of the benchmark's internal plugin. Runs every scenario against the core through the injector
+    and writes the results where the benchmark expects them.
+    """
+    import aigis  #pylint: disable=import-error
+    params = json.loads(os.environ[PARAMS_ENV])
+    calls = params["calls"]
+    results = []
+
+    results.append(_measure("noop", aigis.bench.noop, calls))
+    results.append(_measure("constant", aigis.bench.CONSTANT, calls))
+    arguments = {
+        "int": 42,
+        "str": "aigis" * 20,
+        "list": list(range(1000)),
+        "dict": {str(i): i for i in range(1000)},
+        "custom": _Custom(list(range(1000)))
+    }
+    for kind, value in arguments.items():
+        results.append(_measure(
+            "echo", lambda value=value: aigis.bench.echo(value), calls, argument=kind
+        ))
+    for size in params["sizes"]:
+        # Large payloads take a while, no need for as many calls to get stable numbers
+        count = max(10, min(calls, calls * 1024 // max(size, 1)))
+        results.append(_measure(
+            "payload", lambda size=size: aigis.bench.payload(size), count, size=size
+        ))
+    for size in (10, 1000, 100000):
+        count = max(10, calls // max(1, size // 100))
+        results.append(_measure(
+            "structure", lambda size=size: aigis.bench.structure(size), count, size=size
+        ))
+        results.append(_measure(
+            "custom", lambda size=size: aigis.bench.custom(size), count, size=size
+        ))
+    for concurrency in params["concurrency"]:
+        results.append(_measure(
+            "noop", aigis.bench.noop, calls, concurrency=concurrency
+        ))
+        results.append(_measure(
+            "sleep", lambda: aigis.bench.sleep(0.001), calls // 4, concurrency=concurrency, seconds=0.001
+        ))
+
+    with open(os.environ[RESULTS_ENV], "w") as f:
+        json.dump(results, f)
+
+
+def _write_plugins(tmp):
+    """
+    Write the stand-in core plugin and the benchmark's internal plugin.
+
+    :param str tmp: directory to write the plugins in
+
+    :returns: the source paths of the core plugin and internal plugin
+    :rtype: tuple(str, str)
+    """
+    core = os.path.join(tmp, CORE_PLUGIN)
+    client = os.path.join(tmp, CLIENT_PLUGIN)
+    for root, files in (
+            (core, {"AIGIS/AIGIS.config": _CORE_CONFIG, "AIGIS/AIGIS.core": _CORE_SKILLS}),
+            (client, {"AIGIS/AIGIS.config": _CLIENT_CONFIG, "main.py": _CLIENT_MAIN % os.path.dirname(
+                os.path.abspath(__file__)
+            )})
+    ):
+        for path, content in files.items():
+            os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+            with open(os.path.join(root, path), "w") as f:
+                f.write(content)
+    return core, client
+
+
+def _git_commit():
+    """
+    :returns: the commit AIGIS is currently at, if it can be found
+    :rtype: str|None
+    """
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=AIGIS_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:  #pylint: disable=broad-except
+        return None
+
+
+def run(options):
+    """
+    Boot AIGIS with the benchmark plugins and wait for the results.
+
+    :param Namespace options: the parsed command line options
+
+    :returns: the benchmark report
+    :rtype: dict
+
+    :raises TimeoutError: if the internal plugin does not report in time
+    """
+    sys.path.insert(0, AIGIS_ROOT)
+    from utils import path_utils, copy_utils  #pylint: disable=import-error,no-name-in-module
+    tmp = tempfile.mkdtemp(prefix="aigisbench")
+    core, client = _write_plugins(tmp)
+    # Start from clean runtime locations, or files left there by previous runs would be carried over
+    for name in (CORE_PLUGIN, CLIENT_PLUGIN):
+        copy_utils.remove(os.path.join(path_utils.PLUGIN_ROOT_PATH, name))
+
+    config = os.path.join(tmp, "config.aigis")
+    with open(config, "w") as f:
+        f.write("[core]\n%s = %s\n\n[internal]\n%s = %s\n\n[external]\n\n[rpc]\nlocal_transport = %s\nserver = %s\n" % (
+            CORE_PLUGIN, json.dumps(core), CLIENT_PLUGIN, json.dumps(client), json.dumps(options.transport),
+            json.dumps(options.server)
+        ))
+    results_path = os.path.join(tmp, "results.json")
+    os.environ[PARAMS_ENV] = json.dumps({
+        "calls": options.calls,
+        "sizes": options.sizes,
+        "concurrency": options.concurrency
+    })
+    os.environ[RESULTS_ENV] = results_path
+
+    from core.AigisCore import Aigis  #pylint: disable=import-error,no-name-in-module
+    Aigis(config)
+    start = time.time()
+    while not os.path.exists(results_path):
+        if time.time() - start > options.timeout:
+            raise TimeoutError("Benchmark plugin did not report within %ss, check its log." % options.timeout)
+        time.sleep(0.1)
+    # Make sure the file is fully written
+    time.sleep(0.1)
+    with open(results_path) as f:
+        results = json.load(f)
+    shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "transport": options.transport,
+            "server": options.server,
+            "calls": options.calls
+        },
+        "results": results
+    }
+
+
+def _key(result):
+    """
+    :returns: what identifies a scenario between runs
+    :rtype: tuple
+    """
+    return tuple(sorted(
+        (key, str(value)) for key, value in result.items()
+        if not key.endswith(("_ms", "_sec")) and key != "calls"
+    ))
+
+
+def compare(report, previous):
+    """
+    Print the relative change of each scenario between two benchmark reports.
+
+    :param dict report: the current report
+    :param dict previous: the report to compare against
+    """
+    before = {_key(result): result for result in previous["results"]}
+    print("%-60s %12s %12s %12s" % ("scenario", "p50", "p99", "calls/sec"), file=sys.stderr)
+    for result in report["results"]:
+        old = before.get(_key(result))
+        if not old:
+            continue
+        name = ", ".join("%s=%s" % item for item in _key(result) if item[0] != "name")
+        print("%-60s %+11.1f%% %+11.1f%% %+11.1f%%" % (
+            "%s (%s)" % (result["name"], name),
+            (result["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0,
+            (result["p99_ms"] / old["p99_ms"] - 1) * 100 if old["p99_ms"] else 0,
+            (result["calls_per_sec"] / old["calls_per_sec"] - 1) * 100 if old["calls_per_sec"] else 0
+        ), file=sys.stderr)
+
+
+def main():
+    """
+    Run the benchmark from the command line.
+    """
+    parser = ArgumentParser(description="Benchmark the AIGIS RPC round trips.")
+    parser.add_argument("-o", "--output", help="File to write the JSON report to. Printed if not set.")
+    parser.add_argument("--compare", help="Previous JSON report to compare the results with.")
+    parser.add_argument("--calls", type=int, default=2000, help="Number of calls per scenario.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[0, 1024, 65536, 1048576, 8388608],
+                        help="Payload sizes to measure, in bytes.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Number of concurrent callers to measure.")
+    parser.add_argument("--transport", default="tcp", choices=["tcp", "unix"],
+                        help="Transport used by the internal plugin.")
+    parser.add_argument("--server", default="manager", choices=["manager", "asyncio"],
+                        help="Kind of server serving the internal plugin.")
+    parser.add_argument("--timeout", type=float, default=600, help="Max number of seconds to wait for results.")
+    options = parser.parse_args()
+
+    report = run(options)
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    if options.compare:
+        with open(options.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ This is just a slimmed version of the injector from proxinator/injector.
 It can be used to simulate the environment of an internal plugin at any time.
 """
 import sys
+import array
+import pickle
 from multiprocess.managers import SyncManager
 
 
@@ -14,7 +16,7 @@ class _WrapManager(SyncManager):
 _WrapManager.register("get_aigis")
 _WMGR = _WrapManager(address=("0.0.0.0", 50000), authkey=b"aigis")
 _WMGR.connect()
-_REMOTE_AIGIS_CORE = _WMGR.get_aigis()
+_REMOTE_AIGIS_CORE = _WMGR.get_aigis("AIGISTerminal")
 
 
 def _inject(pseq, *args, **kwargs):
@@ -29,7 +31,99 @@ def _inject(pseq, *args, **kwargs):
     :returns: whatever the remote processing of the pseq returns, if it is a valid type
     :rtype: object
     """
-    return _REMOTE_AIGIS_CORE.parse_pseq(pseq, *args, **kwargs)
+    return _unpack(_REMOTE_AIGIS_CORE.parse_pseq(pseq, *args, **kwargs))
+
+
+def _unpack(reply):
+    """
+    Regenerate the result of a call from what was sent over by the server.
+
+    :param tuple reply: (kind, payload, generation) as packed by the server
+
+    :returns: the result of the call
+    :rtype: object
+    """
+    kind, payload = reply[:2]
+    if kind == "shm":
+        name, nbytes, rtype, typecode = payload
+        from multiprocess.shared_memory import SharedMemory  # Only sent by cores running python 3.8+
+        segment = SharedMemory(name=name)
+        data = bytes(segment.buf[:nbytes])
+        segment.close()
+        segment.unlink()
+        if rtype == "array":
+            return array.array(typecode, data)
+        return data if rtype == "bytes" else bytearray(data)
+    if kind == "p5":
+        return pickle.loads(payload)
+    if kind == "iter":
+        return _iterate(*payload)
+    if kind == "ref":
+        return _AIGISRemoteObject(*payload)
+    if kind != "obj":
+        raise TypeError("Replies of kind %s are not supported by the terminal." % kind)
+    return payload
+
+
+def _iterate(stream_id, chunk, done):
+    """
+    Iterate over the items of an iterator returned by a skill, pulling them from the core chunk by chunk.
+
+    :param int stream_id: id of the stream in the core
+    :param tuple chunk: the packed first chunk of items
+    :param bool done: whether the iterator is already exhausted
+
+    :returns: the items
+    :rtype: generator
+    """
+    try:
+        yield from _unpack(chunk)
+        while not done:
+            reply = _REMOTE_AIGIS_CORE.next_chunk(stream_id)
+            done = reply[2]
+            yield from _unpack(reply)
+    finally:
+        if not done:
+            _REMOTE_AIGIS_CORE.close_stream(stream_id)
+
+
+class _AIGISRemoteObject():
+    """
+    Handle to an object returned by reference by a skill, which stays in the core. Unlike in the injector, the
+    object isn't released when the handle is dropped, AIGISrelease() has to be called.
+
+    :param int ref_id: id of the reference in the core
+    :param str rtype: name of the type of the object
+    :param list[str] methods: methods of the object which can be called through the handle
+    """
+    def __init__(self, ref_id, rtype, methods):
+        self._AIGISref = ref_id
+        self._AIGIStype = rtype
+        self._AIGISmethods = frozenset(methods)
+
+    def __getattr__(self, attr):
+        """
+        :param str attr: the attribute requested
+
+        :returns: a function forwarding calls if the attribute is a method, the value of the attribute in
+        the core otherwise
+        :rtype: object
+        """
+        if attr.startswith("__"):
+            raise AttributeError(attr)
+        if attr in self._AIGISmethods:
+            return lambda *args, **kwargs: _unpack(_REMOTE_AIGIS_CORE.ref_call(self._AIGISref, attr, *args, **kwargs))
+        return _unpack(_REMOTE_AIGIS_CORE.ref_getattr(self._AIGISref, attr))
+
+    def AIGISrelease(self):
+        """
+        Release the object in the core.
+        """
+        _REMOTE_AIGIS_CORE.ref_release(self._AIGISref)
+
+    def __repr__(self):
+        return "<aigis handle to %s object>" % self._AIGIStype
+
 
 class _AIGISCopyCat():
     """
@@ -0,0 +1,98 @@
+"""
+Tests syncing the source of plugins with utils/git_utils, against a bare repository made on disk.
+Run from the root of the repo with `python -m pytest tests`.
+"""
+import os
+import sys
+import subprocess
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import git_utils  #pylint: disable=wrong-import-position
+
+
+def _git(*args, cwd=None):
+    """
+    Run a git command, with an identity to commit with.
+
+    :param str args: the command's args
+    :param str cwd: the directory to run it in
+    """
+    subprocess.run(
+        ("git", "-c", "user.name=AIGIS", "-c", "user.email=aigis@localhost") + args,
+        cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+
+
+def _commit(work, content):
+    """
+    Commit a new version of the plugin's file and push it to the remote's master branch.
+
+    :param str work: the path of the working clone
+    :param str content: the new content of the file
+    """
+    with open(os.path.join(work, "plugin.py"), "w") as plugin_file:
+        plugin_file.write(content)
+    _git("add", "plugin.py", cwd=work)
+    _git("commit", "-m", content, cwd=work)
+    _git("push", "origin", "HEAD:refs/heads/master", cwd=work)
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """
+    :returns: the file:// URL of a bare repository with a commit on master, and a clone to push to it from
+    :rtype: tuple[str, str]
+    """
+    bare, work = str(tmp_path / "remote.git"), str(tmp_path / "work")
+    _git("init", "--bare", bare)
+    _git("clone", bare, work)
+    _commit(work, "first")
+    return "file://" + bare, work
+
+
+def _read(path):
+    """
+    :param str path: the path of a clone
+
+    :returns: the content of the plugin's file in the clone
+    :rtype: str
+    """
+    with open(os.path.join(path, "plugin.py")) as plugin_file:
+        return plugin_file.read()
+
+
+def test_sync_clones(remote, tmp_path):
+    url, _ = remote
+    clone = str(tmp_path / "clone")
+    assert git_utils.sync(url, clone) is True
+    assert _read(clone) == "first"
+
+
+def test_sync_unchanged(remote, tmp_path):
+    url, _ = remote
+    clone = str(tmp_path / "clone")
+    git_utils.sync(url, clone)
+    assert git_utils.sync(url, clone) is False
+    assert _read(clone) == "first"
+
+
+def test_sync_updates(remote, tmp_path):
+    url, work = remote
+    clone = str(tmp_path / "clone")
+    git_utils.sync(url, clone)
+    _commit(work, "second")
+    assert git_utils.sync(url, clone) is True
+    assert _read(clone) == "second"
+    assert git_utils.sync(url, clone) is False
+
+
+def test_sync_missing_branch(remote, tmp_path):
+    url, _ = remote
+    clone = str(tmp_path / "clone")
+    with pytest.raises(git_utils.GitSyncError):
+        git_utils.sync(url, clone, branch="missing")
+    git_utils.sync(url, clone)
+    with pytest.raises(git_utils.GitSyncError):
+        git_utils.sync(url, clone, branch="missing")
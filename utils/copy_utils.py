@@ -0,0 +1,248 @@
+"""
+Sync the source of plugins living on local disk into their runtime location.
+
+The size and modification time of every file of the source are recorded in a manifest each time the plugin is
+synced. Syncing again only compares the source with the manifest, so an unchanged plugin costs a walk of its
+source and nothing else. When something changed, a new snapshot of the plugin is built next to the current
+one: files which didn't change are hardlinked from the current snapshot, and the others are cloned with a
+reflink if the filesystem supports it, copied otherwise.
+
+The runtime location is a symlink to the current snapshot, and a new snapshot is swapped in by replacing the
+symlink in a single rename, so the plugin is never seen half updated nor missing. Runtime locations which are
+still plain directories, from before snapshots were linked, are moved aside once to make room for the link.
+
+Files the plugin created in its runtime location, which the source never had, are carried over to the new
+snapshot. Like shutil.copytree, symlinks in the source are followed.
+"""
+import os
+import json
+import time
+import errno
+import shutil
+try:
+    import fcntl
+except ImportError:  # Not on Windows
+    fcntl = None
+
+from utils import path_utils
+
+MANIFEST_LOCATION = os.path.join(path_utils.CACHE_LOCATION, "snapshots")
+# ioctl cloning a whole file on filesystems sharing blocks between files, such as btrfs and xfs.
+_FICLONE = 0x40049409
+# Errors telling the filesystems or platform can't reflink at all, rather than for a specific file.
+_NO_REFLINK = {errno.EOPNOTSUPP, errno.ENOTTY, errno.ENOSYS, errno.EINVAL, errno.EXDEV}
+# Whether reflinks are worth trying, until they are found not to be supported.
+_REFLINK = fcntl is not None
+
+
+def sync(source, path):
+    """
+    Bring the runtime location of a plugin up to date with its source.
+
+    :param str source: the plugin's source directory
+    :param str path: the plugin's runtime location
+
+    :returns: whether anything changed
+    :rtype: bool
+
+    :raises OSError: if the source can't be read or the snapshot can't be built
+    """
+    manifest_path = _manifest_path(path)
+    manifest = _manifest(source)
+    previous = _read_manifest(manifest_path) if os.path.isdir(path) else {}
+    if manifest == previous:
+        return False
+    snapshot = "%s.%s" % (path, time.time_ns())
+    try:
+        _build(source, path, snapshot, manifest, previous)
+        _swap(path, snapshot)
+    except BaseException:
+        shutil.rmtree(snapshot, ignore_errors=True)
+        raise
+    path_utils.ensure_path_exists(MANIFEST_LOCATION)
+    with open(manifest_path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return True
+
+
+def remove(path):
+    """
+    Remove the runtime location of a plugin, with all its snapshots, so that the next sync starts over.
+
+    :param str path: the plugin's runtime location
+    """
+    if os.path.islink(path):
+        os.remove(path)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+    for snapshot in _snapshots(path):
+        shutil.rmtree(snapshot, ignore_errors=True)
+    try:
+        os.remove(_manifest_path(path))
+    except OSError:
+        pass
+
+
+def _manifest_path(path):
+    """
+    :param str path: the plugin's runtime location
+
+    :returns: where the manifest of the last sync is kept
+    :rtype: str
+    """
+    return os.path.join(MANIFEST_LOCATION, os.path.basename(path) + ".json")
+
+
+def _snapshots(path):
+    """
+    :param str path: the plugin's runtime location
+
+    :returns: the paths of every snapshot of the plugin, current or not
+    :rtype: list[str]
+    """
+    parent, name = os.path.split(path)
+    try:
+        entries = os.listdir(parent or ".")
+    except OSError:
+        return []
+    return [
+        os.path.join(parent, entry) for entry in entries
+        if entry.startswith(name + ".") and entry[len(name) + 1:].isdigit()
+    ]
+
+
+def _swap(path, snapshot):
+    """
+    Point the runtime location at a new snapshot, then remove the snapshots it doesn't point at anymore.
+
+    :param str path: the plugin's runtime location
+    :param str snapshot: the new snapshot
+    """
+    retired = None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # A directory can't be replaced by a link, this is the only time the runtime location is missing
+        retired = path + ".retired"
+        if os.path.exists(retired):
+            shutil.rmtree(retired)
+        os.rename(path, retired)
+    link = snapshot + ".link"
+    # Relative, so that the plugins' root can be moved as a whole
+    os.symlink(os.path.basename(snapshot), link)
+    try:
+        os.replace(link, path)
+    except BaseException:
+        os.remove(link)
+        raise
+    if retired is not None:
+        shutil.rmtree(retired, ignore_errors=True)
+    for old in _snapshots(path):
+        if old != snapshot:
+            shutil.rmtree(old, ignore_errors=True)
+
+
+def _manifest(source):
+    """
+    :param str source: the plugin's source directory
+
+    :returns: the size and modification time of every file of the source, by path relative to it, directories
+    having None
+    :rtype: dict[str, list[int]|None]
+    """
+    manifest = {}
+    for root, dirs, files in os.walk(source, followlinks=True):
+        relroot = os.path.relpath(root, source)
+        for name in dirs:
+            manifest[os.path.normpath(os.path.join(relroot, name))] = None
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            manifest[os.path.normpath(os.path.join(relroot, name))] = [stat.st_size, stat.st_mtime_ns]
+    return manifest
+
+
+def _read_manifest(manifest_path):
+    """
+    :param str manifest_path: where the manifest of the last sync is kept
+
+    :returns: the manifest of the last sync, empty if there is none
+    :rtype: dict[str, list[int]|None]
+    """
+    try:
+        with open(manifest_path) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def _build(source, path, staging, manifest, previous):
+    """
+    Build a new snapshot of the plugin.
+
+    :param str source: the plugin's source directory
+    :param str path: the plugin's current snapshot
+    :param str staging: where to build the new snapshot
+    :param dict manifest: the manifest of the source
+    :param dict previous: the manifest of the current snapshot
+    """
+    os.makedirs(staging)
+    for relpath, stat in sorted(manifest.items()):
+        target = os.path.join(staging, relpath)
+        if stat is None:
+            os.makedirs(target, exist_ok=True)
+            continue
+        current = os.path.join(path, relpath)
+        if previous.get(relpath) == stat and _hardlink(current, target):
+            continue
+        _copy(os.path.join(source, relpath), target)
+    # Carry over what the plugin created at runtime
+    for root, dirs, files in os.walk(path):
+        relroot = os.path.relpath(root, path)
+        for name in dirs + files:
+            relpath = os.path.normpath(os.path.join(relroot, name))
+            if relpath in manifest or relpath in previous:
+                continue
+            current = os.path.join(root, name)
+            target = os.path.join(staging, relpath)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            if os.path.isdir(current) and not os.path.islink(current):
+                os.makedirs(target, exist_ok=True)
+            elif not _hardlink(current, target):
+                shutil.copy2(current, target, follow_symlinks=False)
+    for relpath in manifest:
+        if manifest[relpath] is None:
+            shutil.copystat(os.path.join(source, relpath), os.path.join(staging, relpath))
+
+
+def _hardlink(current, target):
+    """
+    :param str current: file of the current snapshot
+    :param str target: where to link it in the new snapshot
+
+    :returns: whether the file could be linked
+    :rtype: bool
+    """
+    try:
+        os.link(current, target, follow_symlinks=False)
+    except OSError:
+        return False
+    return True
+
+
+def _copy(src, dst):
+    """
+    Copy a file of the source into the new snapshot, with a reflink if the filesystem supports it.
+
+    :param str src: file of the source
+    :param str dst: where to put it in the new snapshot
+    """
+    global _REFLINK  #pylint: disable=global-statement
+    if _REFLINK:
+        try:
+            with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+                fcntl.ioctl(dst_file.fileno(), _FICLONE, src_file.fileno())
+            shutil.copystat(src, dst)
+            return
+        except OSError as e:
+            if e.errno in _NO_REFLINK:
+                _REFLINK = False
+    shutil.copy2(src, dst)
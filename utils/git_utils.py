@@ -0,0 +1,87 @@
+"""
+Sync the source of plugins hosted in git repositories.
+
+Plugins are cloned shallow, with only the tip of their branch, since AIGIS never needs their history. Plugins
+already cloned first compare the commit of their remote branch with the one checked out, which is a single
+cheap round trip, and only fetch and move to the new commit when they differ. Local changes made to the clone
+are overwritten on update.
+
+Anything git can clone from works as a source, including file:// URLs to local bare repositories.
+"""
+import os
+import subprocess
+
+from utils import exc_utils
+
+# Branch plugins are synced with.
+BRANCH = "master"
+# Max number of seconds a git command may take.
+GIT_TIMEOUT = 300
+
+# Never wait on a prompt for credentials, there's nobody to answer it
+_GIT_ENV = dict(os.environ, GIT_TERMINAL_PROMPT="0")
+
+
+def sync(url, path, branch=BRANCH):
+    """
+    Make sure a plugin's clone is at the tip of its remote branch.
+
+    :param str url: the URL of the repository
+    :param str path: the path of the clone
+    :param str branch: the branch to sync with
+
+    :returns: whether the source changed, being cloned or updated
+    :rtype: bool
+
+    :raises GitSyncError: if the repository can't be cloned, or the clone can't be updated
+    """
+    if not os.path.isdir(os.path.join(path, ".git")):
+        _git("clone", "--depth", "1", "--single-branch", "--branch", branch, url, path)
+        return True
+    # Asking the URL configured rather than the clone's origin, in case the plugin moved
+    remote = _git("ls-remote", url, "refs/heads/%s" % branch, cwd=path).split()
+    if not remote:
+        raise GitSyncError("Branch %s not found in %s." % (branch, url))
+    if remote[0] == _git("rev-parse", "HEAD", cwd=path).strip():
+        return False
+    _git("fetch", "--depth", "1", url, branch, cwd=path)
+    _git("reset", "--hard", "FETCH_HEAD", cwd=path)
+    return True
+
+
+def _git(*args, cwd=None):
+    """
+    Run a git command.
+
+    :param str args: the command's args
+    :param str cwd: the directory to run it in
+
+    :returns: the command's output
+    :rtype: str
+
+    :raises GitSyncError: if the command fails or times out
+    """
+    try:
+        return subprocess.run(
+            ("git",) + args,
+            cwd=cwd,
+            env=_GIT_ENV,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            timeout=GIT_TIMEOUT,
+            check=True,
+            universal_newlines=True
+        ).stdout
+    except subprocess.CalledProcessError as e:
+        raise GitSyncError("git %s failed:\n%s" % (args[0], e.stderr.strip())) from None
+    except subprocess.TimeoutExpired:
+        raise GitSyncError("git %s timed out after %s seconds." % (args[0], GIT_TIMEOUT)) from None
+    except OSError as e:
+        raise GitSyncError("Could not run git: %s" % e) from None
+
+
+class GitSyncError(exc_utils.PluginLoadError):
+    """
+    Error for when the source of a plugin can't be synced.
+    """
@@ -10,6 +10,9 @@ SECRET_DUMP = os.path.abspath(os.path.join(os.path.join(os.path.dirname(__file__
 # Logging
 LOG_LOCATION = os.path.abspath(os.path.join(os.path.dirname(__file__), "../log"))
 PLUGIN_LOG_LOCATION = os.path.abspath(os.path.join(os.path.dirname(__file__), "../log/plugins/"))
+# Caches
+CACHE_LOCATION = os.path.abspath(os.path.join(os.path.dirname(__file__), "../cache"))
+PIP_CACHE_LOCATION = os.path.join(CACHE_LOCATION, "pip")
 
 def ensure_path_exists(path):
     """
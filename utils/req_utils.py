@@ -0,0 +1,161 @@
+"""
+Keep track of the requirements installed for each plugin, so that they aren't installed again on every load.
+
+An install is recorded under a hash of everything that decides what it installs: the content of the
+requirements file, the install command, the installer it resolves to and the interpreter running AIGIS.
+Installs are skipped while the hash of a plugin matches the recorded one. Installs running pip are also given a
+package cache shared by every plugin, so that dependencies they have in common are only downloaded and built
+once. Other installers, and pip commands choosing their own cache or none with --cache-dir or --no-cache-dir,
+are run as they are and don't share anything.
+
+Nothing tells whether installed packages are removed behind AIGIS's back, so recorded installs go stale after
+a while, and are run again on the next load. Evicting them also prunes the shared package cache.
+"""
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+from threading import Lock
+
+from utils import path_utils
+
+# Number of days after which a recorded install is run again, unless configured otherwise.
+MAX_AGE_DAYS = 7
+INSTALLS_FILE = os.path.join(path_utils.CACHE_LOCATION, "requirements.json")
+# Executables of pip, such as pip, pip3 or pip3.7.exe
+_PIP = re.compile(r"^pip[\d.]*(\.exe)?$", re.IGNORECASE)
+
+_LOCK = Lock()
+
+
+def requirements_key(command, requirement_file):
+    """
+    Hash everything deciding what an install does.
+
+    :param list[str] command: the install command, without the requirements file
+    :param str requirement_file: path to the requirements file
+
+    :returns: the hash of the install, or None if the requirements file can't be read
+    :rtype: str|None
+    """
+    digest = hashlib.sha256()
+    try:
+        with open(requirement_file, "rb") as requirements:
+            digest.update(requirements.read())
+    except OSError:
+        return None
+    installer = shutil.which(command[0]) or command[0]
+    for part in [os.path.realpath(installer), sys.executable] + command:
+        digest.update(b"\0" + part.encode())
+    return digest.hexdigest()
+
+
+def is_installed(plugin_name, key):
+    """
+    :param str plugin_name: name of the plugin
+    :param str key: hash of the install, from requirements_key
+
+    :returns: whether this exact install was already done for the plugin
+    :rtype: bool
+    """
+    if key is None:
+        return False
+    with _LOCK:
+        entry = _read().get(plugin_name)
+    return entry is not None and entry["key"] == key
+
+
+def record(plugin_name, key):
+    """
+    Record a successful install.
+
+    :param str plugin_name: name of the plugin
+    :param str key: hash of the install, from requirements_key
+    """
+    if key is None:
+        return
+    with _LOCK:
+        installs = _read()
+        installs[plugin_name] = {"key": key, "installed": time.time()}
+        _write(installs)
+
+
+def evict(max_age_days=MAX_AGE_DAYS):
+    """
+    Drop the recorded installs older than a number of days, and the packages of the shared cache which
+    weren't used in as long.
+
+    :param float max_age_days: number of days after which recorded installs are stale
+
+    :returns: the names of the plugins whose install was dropped
+    :rtype: list[str]
+    """
+    limit = time.time() - max_age_days * 86400
+    with _LOCK:
+        installs = _read()
+        stale = [name for name, entry in installs.items() if entry["installed"] < limit]
+        if stale:
+            for name in stale:
+                del installs[name]
+            _write(installs)
+    for root, _, files in os.walk(path_utils.PIP_CACHE_LOCATION):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+                if max(stat.st_atime, stat.st_mtime) < limit:
+                    os.remove(path)
+            except OSError:
+                pass
+    return stale
+
+
+def install_command(command):
+    """
+    Have an install share the package cache of the other plugins, if it runs pip and doesn't choose its own.
+
+    :param list[str] command: the install command, without the requirements file
+
+    :returns: the command to run
+    :rtype: list[str]
+    """
+    if any(arg == "--no-cache-dir" or arg.startswith("--cache-dir") for arg in command):
+        return command
+    if _PIP.match(os.path.basename(command[0])):
+        at = 1
+    elif command[1:3] == ["-m", "pip"]:
+        at = 3
+    else:
+        return command
+    path_utils.ensure_path_exists(path_utils.PIP_CACHE_LOCATION)
+    return command[:at] + ["--cache-dir", path_utils.PIP_CACHE_LOCATION] + command[at:]
+
+
+def _read():
+    """
+    Read the recorded installs. Must be called with the lock held.
+
+    :returns: the recorded installs, by plugin name
+    :rtype: dict[str, dict]
+    """
+    try:
+        with open(INSTALLS_FILE) as installs:
+            return json.load(installs)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(installs):
+    """
+    Replace the recorded installs. Must be called with the lock held.
+
+    :param dict[str, dict] installs: the recorded installs, by plugin name
+    """
+    path_utils.ensure_path_exists(path_utils.CACHE_LOCATION)
+    temp = INSTALLS_FILE + ".tmp"
+    with open(temp, "w") as installs_file:
+        json.dump(installs, installs_file, indent=2)
+    os.replace(temp, INSTALLS_FILE)